@@ -0,0 +1,176 @@
+# ______ASYNC CANVAS CLIENT______
+#
+# asyncio version of the Canvas calls a run makes per student (reading submissions and submitting them),
+# for when hundreds or thousands of small requests should be in flight at once without a thread each. It needs aiohttp, which is optional: without it ASYNC_AVAILABLE is False and
+# everything keeps using canvasapi on worker threads.
+#
+# The asyncio loop runs on one background thread for the whole app (Event_Loop). The transfer engine
+# reaches it from its worker thread through Event_Loop.run, so Tk only ever sees a normal Task_Runner task.
+# Results are canvasapi objects built on the sync Canvas handle's requester, so they can be used with the
+# rest of the app as normal.
+#
+# Requests have connect and read timeouts. Canvas's rate limit is per token, so they take a place from
+# canvas_http's GOVERNOR like the sync session's requests do: they count towards its in-flight limit, wait
+# out its pauses, report each response to it and retry throttled requests after its backoff, so sync and
+# async calls running at once slow down together. max_in_flight only caps the client's connections.
+# Canvas errors are raised as the same canvasapi exceptions the sync calls raise, and network errors as
+# Async_Request_Error, an OSError like requests' own, so callers handle both paths the same way.
+
+import asyncio
+import json
+import threading
+import time
+from urllib.parse import urlencode
+from canvasapi import exceptions as c_exceptions
+from canvasapi.submission import Submission
+from canvasapi.util import combine_kwargs
+from canvas_http import GOVERNOR, MAX_RETRIES
+import tracing
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+ASYNC_AVAILABLE = aiohttp is not None
+MAX_IN_FLIGHT = 64
+PER_PAGE = 100
+
+class Async_Request_Error(OSError):
+    pass
+
+class Event_Loop:
+    # an asyncio loop running forever on a daemon thread
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target = self.loop.run_forever,name = "asyncio",daemon = True)
+        self.thread.start()
+
+    def submit(self,coroutine):
+        # schedules coroutine on the loop, returns a concurrent.futures.Future for it
+        return asyncio.run_coroutine_threadsafe(coroutine,self.loop)
+
+    def run(self,coroutine):
+        # runs coroutine from another thread and waits for it
+        return self.submit(coroutine).result()
+
+LOOP = None
+loop_lock = threading.Lock()
+
+def event_loop():
+    # the app's one asyncio loop, started the first time it is needed
+    global LOOP
+    with loop_lock:
+        if LOOP is None:
+            LOOP = Event_Loop()
+        return LOOP
+
+def form(**kwargs):
+    # canvasapi style parameters (assignment[name]=..., file_ids[]=...) without the ones left as None
+    pairs = []
+    for key, value in combine_kwargs(**kwargs):
+        if value is None:
+            continue
+        pairs.append((key,str(value).lower() if isinstance(value,bool) else str(value)))
+    return pairs
+
+def canvas_error(status,headers,text):
+    # the exception canvasapi's Requester raises for the same response
+    if status == 401:
+        return (c_exceptions.InvalidAccessToken if "WWW-Authenticate" in headers else c_exceptions.Unauthorized)(text)
+    if status == 404:
+        return c_exceptions.ResourceDoesNotExist("Not Found")
+    if status == 429:
+        return c_exceptions.RateLimitExceeded(f"Rate Limit Exceeded. X-Rate-Limit-Remaining: {headers.get('X-Rate-Limit-Remaining','Unknown')}")
+    errors = {400: c_exceptions.BadRequest,403: c_exceptions.Forbidden,409: c_exceptions.Conflict,422: c_exceptions.UnprocessableEntity}
+    if status in errors:
+        return errors[status](text)
+    return c_exceptions.CanvasException(f"Encountered an error: status code {status}")
+
+class Async_Canvas:
+    def __init__(self,canvas,max_in_flight = MAX_IN_FLIGHT,connect_timeout = 10,read_timeout = 60):
+        if not ASYNC_AVAILABLE:
+            raise ImportError("The async Canvas client needs aiohttp (pip install aiohttp)")
+        self.requester = canvas._Canvas__requester
+        self.base_url = self.requester.base_url
+        self.headers = {"Authorization": f"Bearer {self.requester.access_token}","Accept-Encoding": "gzip, deflate"}
+        self.max_in_flight = max_in_flight
+        self.timeout = aiohttp.ClientTimeout(total = None,sock_connect = connect_timeout,sock_read = read_timeout)
+        self.loop = event_loop()
+        self.session = None  # made on the loop the first time it is used
+        self.semaphore = None
+
+    async def open(self):
+        if self.session is None:
+            self.semaphore = asyncio.Semaphore(self.max_in_flight)
+            self.session = aiohttp.ClientSession(headers = self.headers,timeout = self.timeout,
+                                                 connector = aiohttp.TCPConnector(limit = self.max_in_flight))
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def shutdown(self):
+        # close from outside the loop, once nothing else is using the client
+        self.loop.run(self.close())
+
+    async def request(self,method,endpoint = None,url = None,params = None,data = None):
+        # returns (json, response links)
+        session = await self.open()
+        url = url or self.base_url + endpoint
+        started = time.perf_counter()
+        queued = 0  # seconds spent waiting for a connection or the governor
+        for attempt in range(MAX_RETRIES + 1):
+            waiting = time.perf_counter()
+            async with self.semaphore:
+                while True:
+                    delay = GOVERNOR.try_acquire()
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                queued += time.perf_counter() - waiting
+                sent = time.perf_counter()
+                headers = None
+                try:
+                    async with session.request(method,url,params = params,data = data) as response:
+                        text = await response.text()
+                        status = response.status
+                        headers = response.headers
+                        links = {rel: str(link['url']) for rel, link in response.links.items()}
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    raise Async_Request_Error(f"{method} {url} failed: {e!r}") from e
+                finally:
+                    GOVERNOR.release_observed(time.perf_counter() - sent,headers)
+            throttled = status == 429 or (status == 403 and "Rate Limit Exceeded" in text)
+            if throttled and attempt < MAX_RETRIES:
+                GOVERNOR.backoff(attempt)  # the next attempt waits for resume_at
+                continue
+            tracer = tracing.TRACER
+            if tracer is not None:
+                tracer.record(method,url if params is None else f"{url}?{urlencode(params)}",status,started,queued,attempt,len(text))
+            if status >= 400:
+                raise canvas_error(status,headers,text)
+            return (json.loads(text) if text else None), links
+
+    async def paginate(self,endpoint,params):
+        # every item on every page, following Canvas's Link headers
+        url = None
+        while True:
+            items, links = await self.request("GET",endpoint,url = url,params = None if url else params)
+            for item in items:
+                yield item
+            url = links.get("next")
+            if url is None:
+                return
+
+    async def get_submissions(self,course_id,assignment_id,student_ids):
+        return [Submission(self.requester,{**submission,'course_id': course_id}) async for submission in
+                self.paginate(f"courses/{course_id}/students/submissions",
+                              form(assignment_ids = [assignment_id],student_ids = list(student_ids),per_page = PER_PAGE))]
+
+    async def submit(self,course_id,assignment_id,submission):
+        created, links = await self.request("POST",f"courses/{course_id}/assignments/{assignment_id}/submissions",
+                                            data = form(submission = submission))
+        return Submission(self.requester,{**created,'course_id': course_id})
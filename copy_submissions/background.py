@@ -0,0 +1,74 @@
+# ______BACKGROUND TASKS______
+#
+# Tk can only be touched from the thread running mainloop, and anything slow on that thread freezes the
+# window. Task_Runner runs the slow parts (every Canvas call) on worker threads and hands their results
+# back to the main loop through a queue that the window polls with after(), so callbacks passed in here
+# are always run on the Tk thread and can update widgets directly.
+
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+import tracing
+
+POLL_MS = 30
+
+class Task:
+    def __init__(self):
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+class Task_Runner:
+    def __init__(self,root,workers = 4):
+        self.root = root
+        self.pool = ThreadPoolExecutor(max_workers = workers,thread_name_prefix = "canvas")
+        self.queue = queue.Queue()
+        self.root.after(POLL_MS,self.poll)
+
+    def submit(self,fn,*args,on_done = None,on_error = None,task = None,**kwargs):
+        # runs fn(*args, **kwargs) off the main loop, then on_done(result) or on_error(exception) on it.
+        # Pass in a Task made beforehand when fn needs to watch its cancel_event.
+        if task is None:
+            task = Task()
+        def work():
+            try:
+                result = fn(*args,**kwargs)
+            except Exception as e:
+                if on_error is not None:
+                    self.post(on_error,e)
+                else:
+                    raise
+            else:
+                if on_done is not None:
+                    self.post(on_done,result)
+        task.future = self.pool.submit(work)
+        return task
+
+    def post(self,callback,*args):
+        # safe to call from any thread, callback(*args) runs on the Tk thread at the next poll
+        self.queue.put((callback,args))
+
+    def poll(self):
+        try:
+            while True:
+                callback, args = self.queue.get_nowait()
+                try:
+                    with tracing.phase(f"ui {getattr(callback,'__name__','callback')}"):
+                        callback(*args)
+                except Exception as e:
+                    print(f"Error in background callback: {e!r}")
+        except queue.Empty:
+            pass
+        try:
+            self.root.after(POLL_MS,self.poll)
+        except RuntimeError:
+            pass  # window is closing
+
+    def shutdown(self):
+        self.pool.shutdown(wait = False,cancel_futures = True)
@@ -0,0 +1,158 @@
+# ______BENCHMARKS______
+#
+# Times the app's heavy paths against mock_canvas.py, so a change that slows down run_script or the
+# student table is caught before release rather than by someone waiting on canvas.ubc.ca:
+#
+#     python benchmark.py                                  # 50, 500 and 5000 students
+#     python benchmark.py --sizes 500 --latency 0.05 --save baseline.json
+#     python benchmark.py --baseline baseline.json         # exits with 1 if anything got slower
+#
+# Each size gets its own mock server and a fresh Canvas handle with nothing cached, and runs
+#   match rosters     Transfer_Engine.get_matched_students, as the student table loads it
+#   resolve students  Transfer_Engine.resolve_students with every student number, as cli.py does
+#   assignment name   picking a free name in a course full of copies of it
+#   table search      building the table's Roster_Index and searching it (no Canvas calls)
+#   transfer          Transfer_Engine.run for every student, as run_script does
+# --mode, --async, --no-graphql, --old-canvas, --failure-rate and the rate limit options run the same
+# benchmarks in those conditions.
+
+import argparse
+import json
+import sys
+import time
+from canvasapi import Canvas
+from canvas_graphql import Canvas_GraphQL
+from canvas_http import install_session
+from lookup import Canvas_Lookup
+from mock_canvas import DESTINATION_COURSE, SOURCE_ASSIGNMENT, SOURCE_COURSE, Mock_Canvas, Mock_Config, Mock_Data
+from search_index import Roster_Index
+from transfer import DEFAULT_WORKERS, MODES, Transfer_Engine, Transfer_Job
+
+SIZES = (50,500,5000)
+TOLERANCE = 0.2  # slower than the baseline by more than this fraction counts as a regression
+NOISE = 0.05  # seconds, differences smaller than this are never a regression
+QUERIES = ("student","12","student 4","1000002","zzz")
+
+def new_engine(server,args):
+    canvas = Canvas(server.url,"mock-token")
+    install_session(canvas)
+    client = None
+    if args.use_async:
+        from async_canvas import Async_Canvas
+        client = Async_Canvas(canvas)
+    return Transfer_Engine(canvas,warn = lambda text: None,workers = args.workers,journal_dir = None,
+                           lookup = Canvas_Lookup(canvas),mode = args.mode,blob_dir = None,client = client,
+                           graphql = None if args.no_graphql else Canvas_GraphQL(canvas))
+
+def match_rosters(server,args):
+    engine = new_engine(server,args)
+    start = time.perf_counter()
+    first = []
+    source_course = engine.lookup.get_course(SOURCE_COURSE)
+    destination_course = engine.lookup.get_course(DESTINATION_COURSE)
+    matched = engine.get_matched_students(source_course,[destination_course],
+                                          on_match = lambda students: first or first.append(time.perf_counter()))
+    return {'students': len(matched),'first match': round(first[0] - start,3) if first else None}
+
+def resolve_students(server,args):
+    engine = new_engine(server,args)
+    numbers = [server.server.data.users[user_id]['sis_user_id'] for user_id in server.server.data.rosters[SOURCE_COURSE]]
+    return {'students': len(engine.resolve_students(SOURCE_COURSE,DESTINATION_COURSE,numbers))}
+
+def assignment_name(server,args):
+    engine = new_engine(server,args)
+    return {'name': engine.get_assignment_name("Assignment 1",engine.lookup.get_course(DESTINATION_COURSE))}
+
+def table_search(server,args):
+    data = server.server.data
+    index = Roster_Index()
+    for row_id, user_id in enumerate(data.rosters[SOURCE_COURSE]):
+        user = data.users[user_id]
+        index.add(row_id,user['name'],user['sis_user_id'],user_id)
+    for query in QUERIES:
+        index.search(query)
+    return {'queries': len(QUERIES)}
+
+def transfer(server,args):
+    engine = new_engine(server,args)
+    try:
+        result = engine.run(Transfer_Job(SOURCE_COURSE,SOURCE_ASSIGNMENT,DESTINATION_COURSE))
+    finally:
+        if engine.client is not None:
+            engine.client.shutdown()
+    return {'submitted': result.submitted,'failed': len(result.errors),
+            'per second': round(result.submitted / result.elapsed,1) if result.elapsed else None}
+
+BENCHMARKS = {
+    "match rosters": match_rosters,
+    "resolve students": resolve_students,
+    "assignment name": assignment_name,
+    "table search": table_search,
+    "transfer": transfer,
+}
+
+def run_size(size,args):
+    config = Mock_Config(latency = args.latency,max_page_size = args.page_size,failure_rate = args.failure_rate,
+                         bucket = None if args.no_rate_limit else args.bucket,cost = args.cost,graphql = not args.old_canvas)
+    timings = {}
+    with Mock_Canvas(Mock_Data(size),config) as server:
+        for name, benchmark in BENCHMARKS.items():
+            if args.only and name not in args.only:
+                continue
+            requests_before = server.server.requests
+            start = time.perf_counter()
+            details = benchmark(server,args)
+            seconds = time.perf_counter() - start
+            details['calls'] = server.server.requests - requests_before
+            timings[name] = seconds
+            print(f"  {name:<18}{seconds:>9.3f}s  " + ", ".join(f"{key} {value}" for key, value in details.items()))
+        if server.server.throttled or server.server.failed:
+            print(f"  server throttled {server.server.throttled} and failed {server.server.failed} requests")
+    return timings
+
+def regressions(results,baseline):
+    found = []
+    for size, timings in results.items():
+        for name, seconds in timings.items():
+            before = baseline.get(size,{}).get(name)
+            if before is not None and seconds - before > NOISE and seconds > before * (1 + TOLERANCE):
+                found.append(f"{size} students, {name}: {before:.3f}s -> {seconds:.3f}s")
+    return found
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark the transfer against a local mock Canvas server.")
+    parser.add_argument('--sizes', type = int, nargs = '+', default = list(SIZES), help = "numbers of students to benchmark")
+    parser.add_argument('--only', nargs = '+', choices = list(BENCHMARKS), help = "run just these benchmarks")
+    parser.add_argument('--workers', type = int, default = DEFAULT_WORKERS)
+    parser.add_argument('--mode', choices = MODES, default = "file_ids")
+    parser.add_argument('--async', dest = 'use_async', action = 'store_true', help = "use the asyncio client, needs aiohttp")
+    parser.add_argument('--no-graphql', action = 'store_true', help = "read rosters and submissions with REST calls only")
+    parser.add_argument('--old-canvas', action = 'store_true', help = "the mock server fails GraphQL queries, so reads fall back to REST")
+    parser.add_argument('--latency', type = float, default = 0.02, help = "seconds the mock server adds to each response")
+    parser.add_argument('--page-size', type = int, default = 100, help = "largest page the mock server sends")
+    parser.add_argument('--bucket', type = float, default = 700, help = "rate limit bucket size")
+    parser.add_argument('--cost', type = float, default = 0.1, help = "rate limit cost of each request")
+    parser.add_argument('--no-rate-limit', action = 'store_true')
+    parser.add_argument('--failure-rate', type = float, default = 0, help = "fraction of requests that fail with a 500")
+    parser.add_argument('--save', metavar = 'FILE', help = "write the timings to FILE as json")
+    parser.add_argument('--baseline', metavar = 'FILE', help = "compare with timings saved by --save")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for size in args.sizes:
+        print(f"{size} students")
+        results[str(size)] = run_size(size,args)
+
+    if args.save:
+        with open(args.save,'w') as file:
+            json.dump(results,file,indent = 2)
+    if args.baseline:
+        with open(args.baseline,'r') as file:
+            found = regressions(results,json.load(file))
+        for line in found:
+            print(f"slower: {line}",file = sys.stderr)
+        return 1 if found else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+# ______ATTACHMENT STORE______
+#
+# Local copies of the submission files the app has downloaded, so sending the same submissions to
+# another course, or retrying a transfer, reads them from disk instead of downloading them again.
+# Files are stored once under their SHA-256, so identical submissions (group work, a shared template)
+# take up space once however many attachments they came from. An SQLite index maps each Canvas
+# attachment (id and size) to its hash and remembers when every file was last used, and the least
+# recently used files are deleted once the store grows past max_bytes.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+MAX_BYTES = 2 * 1024 ** 3
+
+class Blob_Store:
+    def __init__(self,directory,max_bytes = MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        directory.mkdir(parents = True,exist_ok = True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(directory / "index.sqlite3"),check_same_thread = False)
+        with self.lock, self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS blobs (sha TEXT PRIMARY KEY, size INTEGER, used REAL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS attachments (id TEXT, size INTEGER, sha TEXT, PRIMARY KEY (id, size))")
+
+    def path(self,sha):
+        return self.directory / sha[:2] / sha
+
+    def find(self,attachment_id,size):
+        # hash of the stored copy of this attachment, or None if there isn't one
+        with self.lock:
+            row = self.db.execute("SELECT blobs.sha FROM attachments JOIN blobs ON blobs.sha = attachments.sha "
+                                  "WHERE attachments.id = ? AND attachments.size = ?",(str(attachment_id),size)).fetchone()
+        if row is None:
+            return None
+        if not self.path(row[0]).is_file() or self.path(row[0]).stat().st_size != size:
+            self.forget(row[0])  # deleted or damaged outside the app
+            return None
+        return row[0]
+
+    def open(self,sha):
+        with self.lock, self.db:
+            self.db.execute("UPDATE blobs SET used = ? WHERE sha = ?",(time.time(),sha))
+        return open(self.path(sha),'rb')
+
+    def tee(self,chunks,attachment_id,size):
+        # passes chunks through while writing them to the store, the copy is only kept if every one of
+        # size bytes came through
+        temp = self.directory / f"{uuid.uuid4().hex}.part"
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            with open(temp,'wb') as file:
+                for chunk in chunks:
+                    file.write(chunk)
+                    digest.update(chunk)
+                    written += len(chunk)
+                    yield chunk
+            if written == size:
+                self.add(temp,digest.hexdigest(),attachment_id,size)
+        finally:
+            if temp.exists():
+                temp.unlink()
+
+    def add(self,temp,sha,attachment_id,size):
+        path = self.path(sha)
+        path.parent.mkdir(exist_ok = True)
+        os.replace(temp,path)  # the same content stored twice at once ends up as one file either way
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)",(sha,size,time.time()))
+            self.db.execute("INSERT OR REPLACE INTO attachments VALUES (?, ?, ?)",(str(attachment_id),size,sha))
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            oldest = self.db.execute("SELECT sha, size FROM blobs ORDER BY used").fetchall()
+        for sha, size in oldest:
+            if total <= self.max_bytes:
+                break
+            self.forget(sha)
+            total -= size
+
+    def forget(self,sha):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM blobs WHERE sha = ?",(sha,))
+            self.db.execute("DELETE FROM attachments WHERE sha = ?",(sha,))
+        try:
+            self.path(sha).unlink()
+        except OSError:
+            pass  # already gone, or still open for an upload on Windows
+
+    def close(self):
+        with self.lock:
+            self.db.close()
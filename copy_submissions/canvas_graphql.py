@@ -0,0 +1,153 @@
+# ______CANVAS GRAPHQL______
+#
+# Bulk read side of a transfer through Canvas's GraphQL endpoint (POST /api/graphql). Over REST, preparing
+# a transfer pages through the source roster, the destination roster and the chosen students' submissions
+# one list after another. read_transfer asks for all of them in the same query, a page of each per
+# request, so the whole read takes as many requests as the longest of the lists has pages.
+#
+# Nothing is handed back until every list has been read. If GraphQL can't answer (an older Canvas, a
+# field missing from its schema, a permission it reports as an error) GraphQL_Unavailable is raised and
+# the caller reads everything over REST as before. After the first failure this Canvas_GraphQL stops
+# trying for the rest of the session. Queries go through the shared session, so they wait on the rate
+# governor like REST calls.
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from canvasapi import exceptions as c_exceptions
+from canvasapi.submission import Submission
+from canvasapi.user import User
+import tracing
+
+PAGE_SIZE = 100  # Canvas's largest page for a connection
+
+ROSTER_FIELDS = """
+  {alias}: course(id: ${alias}_id) {{
+    usersConnection(first: $first, after: ${alias}_after, filter: {{enrollmentTypes: [StudentEnrollment]}}) {{
+      nodes {{ _id name sortableName shortName sisId loginId }}
+      pageInfo {{ hasNextPage endCursor }}
+    }}
+  }}"""
+
+SUBMISSION_FIELDS = """
+  {alias}: assignment(id: ${alias}_id) {{
+    submissionsConnection(first: $first, after: ${alias}_after) {{
+      nodes {{
+        _id
+        user {{ _id }}
+        attachments {{ _id displayName contentType size url }}
+      }}
+      pageInfo {{ hasNextPage endCursor }}
+    }}
+  }}"""
+
+# kind of list -> (its fields in the query, the connection holding its pages)
+LISTS = {
+    'roster': (ROSTER_FIELDS,'usersConnection'),
+    'submissions': (SUBMISSION_FIELDS,'submissionsConnection'),
+}
+
+class GraphQL_Unavailable(Exception):
+    pass
+
+class Canvas_GraphQL:
+    def __init__(self,canvas):
+        self.canvas = canvas
+        self.requester = canvas._Canvas__requester
+        self.available = True
+        self.lock = threading.Lock()
+
+    def give_up(self):
+        with self.lock:
+            self.available = False
+
+    def query(self,query,variables):
+        if not self.available:
+            raise GraphQL_Unavailable("GraphQL failed earlier this session")
+        try:
+            result = self.canvas.graphql(query,variables)
+        except c_exceptions.Forbidden as e:
+            if "Rate Limit Exceeded" in str(e):
+                raise  # still throttled after the session's retries, REST would be too
+            self.give_up()
+            raise GraphQL_Unavailable(str(e)) from e
+        except (c_exceptions.BadRequest, c_exceptions.Unauthorized, c_exceptions.ResourceDoesNotExist,
+                c_exceptions.UnprocessableEntity, ValueError) as e:
+            # ValueError when the answer isn't json, Unauthorized when the token may use REST but not GraphQL
+            self.give_up()
+            raise GraphQL_Unavailable(str(e)) from e
+        if not isinstance(result,dict) or result.get('errors') or not isinstance(result.get('data'),dict):
+            # an unknown field fails the whole query
+            self.give_up()
+            raise GraphQL_Unavailable(f"GraphQL couldn't answer: {result.get('errors') if isinstance(result,dict) else result}")
+        return result['data']
+
+    def page_query(self,lists,cursors):
+        # the query and its variables for the next page of each list still in cursors
+        fields = []
+        declared = ["$first: Int!"]
+        variables = {'first': PAGE_SIZE}
+        for alias, cursor in cursors.items():
+            fields.append(LISTS[alias.rstrip("0123456789")][0].format(alias = alias))
+            declared += [f"${alias}_id: ID!",f"${alias}_after: String"]
+            variables[f"{alias}_id"] = str(lists[alias])
+            variables[f"{alias}_after"] = cursor
+        return f"query Transfer({', '.join(declared)}) {{{''.join(fields)}\n}}", variables
+
+    def read_lists(self,lists,convert):
+        # lists maps an alias, a kind from LISTS with a number on the end, to the id of its course or
+        # assignment. Returns alias -> every node in that list passed through convert[kind], leaving out
+        # the ones it returns None for, asking for the next page of each unfinished list in one query
+        # until they are all done. The pages come one after another, so each page is converted while the
+        # next one is on its way, as canvasapi objects take longer to build than a page takes to arrive
+        nodes = {alias: [] for alias in lists}
+        cursors = {alias: None for alias in lists}
+        pool = ThreadPoolExecutor(max_workers = 1,thread_name_prefix = "graphql")
+        query = tracing.inherit(self.query)
+        try:
+            pending = pool.submit(query,*self.page_query(lists,cursors))
+            while pending is not None:
+                data = pending.result()
+                page = {}
+                for alias in list(cursors):
+                    connection = (data.get(alias) or {}).get(LISTS[alias.rstrip("0123456789")][1])
+                    if connection is None:
+                        self.give_up()
+                        raise GraphQL_Unavailable(f"GraphQL didn't return {alias}")
+                    page[alias] = connection['nodes']
+                    if connection['pageInfo']['hasNextPage']:
+                        cursors[alias] = connection['pageInfo']['endCursor']
+                    else:
+                        del cursors[alias]
+                pending = pool.submit(query,*self.page_query(lists,cursors)) if cursors else None
+                for alias, page_nodes in page.items():
+                    kind_convert = convert[alias.rstrip("0123456789")]
+                    nodes[alias] += [item for item in map(kind_convert,page_nodes) if item is not None]
+            return nodes
+        finally:
+            pool.shutdown(wait = False,cancel_futures = True)
+
+    def read_transfer(self,course_ids,course_id = None,assignment_id = None):
+        # ({course id: roster as canvasapi Users}, submissions to the assignment in course_id as canvasapi
+        # Submissions). Leave assignment_id as None to only read rosters
+        lists = {f"roster{i}": roster_course_id for i, roster_course_id in enumerate(course_ids)}
+        if assignment_id is not None:
+            lists['submissions0'] = assignment_id
+        nodes = self.read_lists(lists,{'roster': self.user,
+                                       'submissions': lambda node: self.submission(node,course_id,assignment_id)})
+        rosters = {roster_course_id: nodes[f"roster{i}"] for i, roster_course_id in enumerate(course_ids)}
+        return rosters, nodes.get('submissions0',[])
+
+    def user(self,node):
+        # with the fields a REST roster has
+        return User(self.requester,{'id': int(node['_id']),'name': node['name'],'sortable_name': node.get('sortableName'),
+                                    'short_name': node.get('shortName'),'sis_user_id': node.get('sisId'),
+                                    'login_id': node.get('loginId')})
+
+    def submission(self,node,course_id,assignment_id):
+        if node.get('user') is None:
+            return None
+        attachments = [{'id': int(a['_id']),'display_name': a['displayName'],'filename': a['displayName'],
+                        'content-type': a.get('contentType'),'size': a.get('size'),'url': a.get('url')}
+                       for a in node.get('attachments') or []]
+        return Submission(self.requester,{'id': int(node['_id']),'assignment_id': assignment_id,'course_id': course_id,
+                                          'user_id': int(node['user']['_id']),'attachments': attachments})
@@ -0,0 +1,204 @@
+# ______CANVAS HTTP______
+#
+# Everything canvasapi sends goes through the requests session installed here. The session asks a shared
+# Rate_Governor before each request, so parallel and batch runs stay just under Canvas's rate limit
+# instead of crashing on 403 "Rate Limit Exceeded" or being slowed down to one request at a time.
+#
+# Canvas uses a leaky bucket per access token: every response carries X-Request-Cost (what that request
+# took out of the bucket) and X-Rate-Limit-Remaining (what is left). The governor lets more requests run
+# at once while plenty is left, backs off as it runs low and retries throttled requests after a delay.
+#
+# There is one session for the whole process (SESSION), shared by every Canvas handle and everything that
+# talks to Canvas directly, e.g. the file downloads and uploads in reupload.py. It keeps connections alive
+# in a pool big enough for the work running at once, so parallel requests reuse connections rather than
+# each opening a new one and paying for a fresh TLS handshake, asks for gzip responses and never waits
+# forever on a request that has stalled.
+
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+LOW_WATER = 150  # below this much X-Rate-Limit-Remaining, halve the requests in flight and pause
+HIGH_WATER = 450  # above this, let one more request run at once
+LEAK_RATE = 10  # roughly how much of the bucket Canvas refills per second
+MAX_RETRIES = 6
+MAX_BACKOFF = 30
+BUCKET_SIZE = 700  # Canvas's bucket when nothing has been used yet
+TIMEOUT = (10,60)  # seconds to connect and to wait for a response, for requests that don't set their own
+POOL_HEADROOM = 8  # connections kept beyond the workers, for roster pages and lookups running alongside
+
+def is_throttled(response):
+    if response.status_code == 429:
+        return True
+    return response.status_code == 403 and "Rate Limit Exceeded" in response.text
+
+def average(current,value,weight = 0.2):
+    return value if current is None else current + weight * (value - current)
+
+class Rate_Governor:
+    def __init__(self,max_in_flight = 16):
+        self.cond = threading.Condition()
+        self.max_in_flight = max_in_flight
+        self.limit = max(1,max_in_flight // 2)  # requests allowed in flight right now
+        self.in_flight = 0
+        self.resume_at = 0  # time.monotonic() before which no request is started
+        self.remaining = None
+        self.cost = None  # running average X-Request-Cost
+        self.latency = None  # running average seconds per request
+        self.throttled = 0
+
+    def wait_time(self):
+        # seconds until a new request may start, 0 if it can go now
+        now = time.monotonic()
+        if now < self.resume_at:
+            return self.resume_at - now
+        if self.in_flight >= self.limit:
+            return 0.05
+        return 0
+
+    def acquire(self):
+        with self.cond:
+            while True:
+                delay = self.wait_time()
+                if delay <= 0:
+                    break
+                self.cond.wait(delay)
+            self.in_flight += 1
+
+    def try_acquire(self):
+        # acquire without blocking, for async_canvas.py's coroutines: returns 0 once the request has its
+        # place, otherwise the seconds to wait before trying again
+        with self.cond:
+            delay = self.wait_time()
+            if delay <= 0:
+                self.in_flight += 1
+            return delay
+
+    def release(self,response = None):
+        with self.cond:
+            self.in_flight -= 1
+            if response is not None:
+                self.update(response)
+            self.cond.notify_all()
+
+    def release_observed(self,latency,headers = None):
+        # release for a response that isn't a requests.Response, headers of None when there was no response
+        with self.cond:
+            self.in_flight -= 1
+            if headers is not None:
+                self.observe(latency,headers)
+            self.cond.notify_all()
+
+    def update(self,response):
+        self.observe(response.elapsed.total_seconds(),response.headers)
+
+    def observe(self,latency,headers):
+        # call with cond held
+        self.latency = average(self.latency,latency)
+        remaining = headers.get("X-Rate-Limit-Remaining")
+        cost = headers.get("X-Request-Cost")
+        try:
+            self.cost = average(self.cost,float(cost)) if cost is not None else self.cost
+            if remaining is None:
+                return
+            self.remaining = float(remaining)
+        except ValueError:
+            return
+        if self.remaining < LOW_WATER:
+            self.limit = max(1,self.limit // 2)
+            pause = (LOW_WATER - self.remaining) / LEAK_RATE
+            self.resume_at = max(self.resume_at,time.monotonic() + min(pause,MAX_BACKOFF))
+        elif self.remaining > HIGH_WATER and self.limit < self.max_in_flight:
+            self.limit += 1
+
+    def backoff(self,attempt):
+        # called after a throttled response, returns how long the request waits before it is retried
+        with self.cond:
+            self.throttled += 1
+            self.limit = max(1,self.limit // 2)
+            delay = min(MAX_BACKOFF,0.5 * 2 ** attempt) * (1 + random.random() / 2)
+            self.resume_at = max(self.resume_at,time.monotonic() + delay)
+            return delay
+
+    def estimate_seconds(self,calls,concurrency):
+        # rough time for calls more requests from what this session has seen so far: either the requests
+        # in flight are the limit, or draining the rate limit bucket is
+        latency = self.latency if self.latency is not None else 0.5
+        cost = self.cost if self.cost is not None else latency
+        remaining = self.remaining if self.remaining is not None else BUCKET_SIZE
+        in_flight = max(1,min(concurrency,self.max_in_flight))
+        by_latency = calls * latency / in_flight
+        over_budget = calls * cost - max(0,remaining - LOW_WATER)
+        by_rate_limit = over_budget / LEAK_RATE if over_budget > 0 else 0
+        return max(by_latency,by_rate_limit)
+
+GOVERNOR = Rate_Governor()  # shared by every Canvas handle in the process
+
+class Governed_Session(requests.Session):
+    def __init__(self,governor = GOVERNOR):
+        super().__init__()
+        self.governor = governor
+        self.headers["Accept-Encoding"] = "gzip, deflate"
+        self.headers["Connection"] = "keep-alive"
+        self.pool_lock = threading.Lock()
+        self.pool_size = 0
+        self.tracer = None  # set by tracing.start()
+        self.fit_pool(governor.max_in_flight)
+
+    def fit_pool(self,workers):
+        # makes sure the pool can keep a connection open for each of workers requests running at once
+        with self.pool_lock:
+            size = max(workers,self.governor.max_in_flight) + POOL_HEADROOM
+            if size <= self.pool_size:
+                return
+            self.pool_size = size
+            for prefix in ("https://","http://"):
+                replaced = self.adapters.get(prefix)
+                self.mount(prefix,HTTPAdapter(pool_connections = 10,pool_maxsize = size))
+                if replaced is not None:
+                    # closes its idle connections now, ones still in use are closed as their requests finish
+                    replaced.close()
+
+    def request(self,method,url,*args,**kwargs):
+        kwargs.setdefault('timeout',TIMEOUT)
+        started = time.perf_counter()
+        if "/api/v1/" not in url and not url.endswith("/api/graphql"):
+            # file downloads and uploads to Canvas's file store don't count against the API rate limit
+            response = super().request(method,url,*args,**kwargs)
+            self.trace(method,url,response,started,0,0,kwargs)
+            return response
+        attempt = 0
+        queued = 0  # seconds spent waiting for the governor
+        while True:
+            waiting = time.perf_counter()
+            self.governor.acquire()
+            queued += time.perf_counter() - waiting
+            response = None
+            try:
+                response = super().request(method,url,*args,**kwargs)
+            finally:
+                self.governor.release(response)
+            if not is_throttled(response) or attempt >= MAX_RETRIES:
+                self.trace(method,url,response,started,queued,attempt,kwargs)
+                return response
+            self.governor.backoff(attempt)
+            attempt += 1
+
+    def trace(self,method,url,response,started,queued,retries,kwargs):
+        if self.tracer is not None:
+            self.tracer.record_call(method,url,response,started,queued,retries,kwargs.get('stream',False))
+
+SESSION = Governed_Session()
+
+def install_session(canvas,session = None):
+    # swaps canvasapi's own requests session for the shared one, every object fetched through this
+    # Canvas handle shares the same requester so they all go through it
+    if session is None:
+        session = SESSION
+    requester = canvas._Canvas__requester
+    if requester._session is not session:
+        requester._session.close()
+        requester._session = session
+    return session
@@ -0,0 +1,165 @@
+# ______COMMAND LINE TOOL______
+#
+# Runs a batch of transfers from a manifest file without opening the app, e.g. for nightly bulk moves:
+#
+#     python cli.py manifest.csv --token mytoken.txt
+#
+# The manifest is either a .csv file with a header row or a .json file holding a list of objects,
+# both using the same fields:
+#
+#     source_assignment   link to the assignment to copy (required)
+#     destination_course  link to the course to copy it into (required)
+#     assignment_name     name for the new assignment, blank keeps the source assignment's name
+#     students            Canvas ids or student numbers to transfer, separated by spaces or ';'
+#                         (a list in .json), blank transfers every student enrolled in both courses
+#
+# All rows run as one pipeline, so the next row's assignment is created while the previous row's
+# submissions are still going in, and courses, rosters and assignment names are only looked up once.
+
+import argparse
+import csv
+import json
+from pathlib import Path
+import re
+import sys
+from canvas_graphql import Canvas_GraphQL
+from lookup import Canvas_Lookup
+from metadata_cache import Metadata_Cache
+import tracing
+from transfer import BLOB_DIR, CACHE_PATH, CANVAS_URL, DEFAULT_TOKEN, DEFAULT_WORKERS, JOB_ERRORS, JOURNAL_DIR, MODES, Transfer_Engine, Transfer_Error, Transfer_Job, get_course_code, load_token
+
+def read_manifest(path):
+    path = Path(path)
+    if path.suffix.lower() == ".json":
+        with open(path,'r') as file:
+            rows = json.load(file)
+        if isinstance(rows,dict):
+            rows = [rows]
+    else:
+        with open(path,'r',newline = '') as file:
+            rows = list(csv.DictReader(file))
+    return rows
+
+def split_students(value):
+    if value is None:
+        return None
+    if isinstance(value,(list,tuple)):
+        students = [str(v).strip() for v in value]
+    else:
+        students = re.split(r"[;\s]+",str(value))
+    students = [s for s in students if s]
+    return students or None
+
+def job_from_row(row,line):
+    source = get_course_code(row.get('source_assignment') or '','assignment')
+    if not source[0]:
+        raise Transfer_Error(f"Row {line}: source_assignment doesn't look like an assignment link")
+    destination = get_course_code(row.get('destination_course') or '','course')
+    if not destination[0]:
+        raise Transfer_Error(f"Row {line}: destination_course doesn't look like a course link")
+    name = (row.get('assignment_name') or '').strip() or None
+    return Transfer_Job(source[1],source[2],destination[1],assignment_name = name), split_students(row.get('students'))
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Transfer Canvas assignments and submissions listed in a manifest file.")
+    parser.add_argument('manifest',help = "CSV or JSON manifest of transfers")
+    parser.add_argument('--token',default = DEFAULT_TOKEN,help = "text file with your Canvas access token")
+    parser.add_argument('--workers',type = int,default = DEFAULT_WORKERS,help = "number of students submitted at the same time")
+    parser.add_argument('--mode',choices = MODES,default = "file_ids",
+                        help = "resubmit the source file ids, upload a copy of every file, or upload a copy only when Canvas refuses the file ids")
+    parser.add_argument('--no-file-cache',action = 'store_true',help = "don't keep local copies of the files re-uploaded by --mode reupload/auto")
+    parser.add_argument('--no-resume',action = 'store_true',help = "don't keep a checkpoint journal or resume interrupted transfers")
+    parser.add_argument('--cache',action = 'store_true',help = "use the app's saved course and roster lookups when they are fresh enough")
+    parser.add_argument('--dry-run',action = 'store_true',help = "work out what would be transferred and how long it would take, without writing anything")
+    parser.add_argument('--stop-on-error',action = 'store_true',help = "stop at the first failed transfer")
+    parser.add_argument('--async',dest = 'use_async',action = 'store_true',
+                        help = "fetch and submit with the asyncio client, every student at once rather than --workers at a time (needs aiohttp)")
+    parser.add_argument('--no-graphql',action = 'store_true',help = "read rosters and submissions with REST calls only")
+    parser.add_argument('--trace',metavar = 'DIR',help = "write a trace of every Canvas call and a timing summary to DIR")
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        tracing.start(args.trace)
+    try:
+        return run(args)
+    finally:
+        summary = tracing.finish()
+        if summary is not None:
+            print(summary,file = sys.stderr)
+
+def run(args):
+
+    result, canvas = load_token(args.token)
+    if result == 0:
+        print(f"No token file found at {args.token}",file = sys.stderr)
+        return 2
+    elif result == 1:
+        print("Access token is invalid.",file = sys.stderr)
+        return 2
+    elif result == 3:
+        print(f"Couldn't reach Canvas at {CANVAS_URL}, check your connection and try again.",file = sys.stderr)
+        return 2
+
+    client = None
+    if args.use_async:
+        from async_canvas import ASYNC_AVAILABLE, Async_Canvas
+        if not ASYNC_AVAILABLE:
+            print("--async needs aiohttp, install it with pip install aiohttp",file = sys.stderr)
+            return 2
+        client = Async_Canvas(canvas)
+    # the client is closed however the run ends, dry runs and rows failing with --stop-on-error included
+    try:
+        return run_jobs(args,canvas,client)
+    finally:
+        if client is not None:
+            client.shutdown()
+
+def run_jobs(args,canvas,client):
+
+    engine = Transfer_Engine(canvas,warn = lambda text: print(f"  warning: {text}",file = sys.stderr),workers = args.workers,
+                             journal_dir = None if args.no_resume else JOURNAL_DIR,
+                             lookup = Canvas_Lookup(canvas,Metadata_Cache(CACHE_PATH) if args.cache else None),mode = args.mode,
+                             blob_dir = None if args.no_file_cache else BLOB_DIR,client = client,
+                             graphql = None if args.no_graphql else Canvas_GraphQL(canvas))
+    rows = read_manifest(args.manifest)
+    jobs = []
+    failed = 0
+    for line, row in enumerate(rows,start = 1):
+        try:
+            job, filters = job_from_row(row,line)
+            if filters is not None:
+                job.students = engine.resolve_students(job.source_course_id,job.destination_course_id,filters)
+                if not job.students:
+                    raise Transfer_Error(f"Row {line}: none of its students are enrolled in both courses")
+        except JOB_ERRORS as e:
+            failed += 1
+            print(f"  failed: {e}",file = sys.stderr)
+            if args.stop_on_error:
+                return 1
+        else:
+            jobs.append(job)
+
+    if args.dry_run:
+        plans, failures = engine.plan_many(jobs)
+        for plan in plans:
+            print(plan.summary())
+        for job, error in failures:
+            print(f"  {job} failed: {error}",file = sys.stderr)
+        print(engine.plan_summary(plans))
+        return 1 if failed or failures else 0
+
+    # one pipelined run: the next assignment is created while the previous one's submissions go in
+    results, failures = engine.run_many(jobs,stop_on_error = args.stop_on_error,
+                                        on_job = lambda i, job: print(f"[{i + 1}/{len(jobs)}] {job}"))
+    for result in results:
+        print(f"  {result.job}: {result.summary()} -> {result.link}")
+        for student in result.errors:
+            print(f"  student {student.user_id} failed: {student.error}",file = sys.stderr)
+    for job, error in failures:
+        print(f"  {job} failed: {error}",file = sys.stderr)
+
+    print(f"{len(results)} of {len(rows)} transfers done")
+    return 1 if failed or failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
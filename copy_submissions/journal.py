@@ -0,0 +1,79 @@
+# ______TRANSFER JOURNAL______
+#
+# Checkpoint file written while a transfer runs so an interrupted transfer (network drop, expired token,
+# closed window) can pick up where it stopped instead of making a new "(1)" assignment and resubmitting
+# everyone. One file per source assignment -> destination course, assignment name and choice of students,
+# so only a run of the very same transfer resumes it. It is appended to as work is done and deleted once
+# the transfer finishes with no failed students.
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+
+def journal_key(job):
+    # file name for the job's journal, the name and students are hashed to keep it short
+    students = sorted(str(student) for student in job.students) if job.students is not None else None
+    options = hashlib.sha1(json.dumps([job.assignment_name,students]).encode()).hexdigest()[:12]
+    return f"{job.source_course_id}_{job.source_assignment_id}_to_{job.destination_course_id}_{options}"
+
+class Transfer_Journal:
+    def __init__(self,path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.assignment_id = None
+        self.done = set()  # (user_id, attachment_id) pairs already submitted
+        if self.path.exists():
+            self.load()
+
+    @classmethod
+    def for_job(cls,directory,job,repeat = 0):
+        # repeat counts the jobs before this one in the same batch that are the same transfer, each gets
+        # its own journal rather than resuming the first one's assignment
+        return cls(Path(directory) / (journal_key(job) + (f"_{repeat + 1}" if repeat else "") + ".jsonl"))
+
+    def load(self):
+        with open(self.path,'r') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # a line cut off by a crash, everything before it is still good
+                if 'assignment_id' in entry:
+                    self.assignment_id = entry['assignment_id']
+                    self.done = set()
+                else:
+                    self.done.add((entry['user_id'],entry['attachment_id']))
+
+    @property
+    def resumable(self):
+        return self.assignment_id is not None
+
+    def write(self,entry):
+        with self.lock:
+            self.path.parent.mkdir(parents = True,exist_ok = True)
+            with open(self.path,'a') as file:
+                file.write(json.dumps(entry) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+    def set_assignment(self,assignment_id):
+        self.assignment_id = assignment_id
+        self.done = set()
+        self.write({'assignment_id': assignment_id})
+
+    def is_done(self,user_id,attachment_id):
+        return (user_id,attachment_id) in self.done
+
+    def mark_done(self,user_id,attachment_id):
+        with self.lock:
+            self.done.add((user_id,attachment_id))
+        self.write({'user_id': user_id,'attachment_id': attachment_id})
+
+    def finish(self):
+        with self.lock:
+            if self.path.exists():
+                self.path.unlink()
+        self.assignment_id = None
+        self.done = set()
@@ -0,0 +1,154 @@
+# ______CANVAS LOOKUPS______
+#
+# Read side of the app's Canvas access: courses, assignments and student rosters. Canvas_Lookup wraps the
+# Canvas handle held in main_app.canvas and answers, in order, from
+#   1. objects already fetched this session (kept in memory for as long as the lookup lives),
+#   2. the on-disk Metadata_Cache when it has a fresh enough copy,
+#   3. Canvas itself, saving what comes back in both.
+# If a second caller asks for something that is already being fetched it waits for that request instead
+# of sending its own. Writes (create_assignment, submit) never go through here.
+
+from concurrent.futures import Future
+import json
+import threading
+from canvasapi.assignment import Assignment
+from canvasapi.course import Course
+from canvasapi.user import User
+from metadata_cache import ASSIGNMENT_TTL, COURSE_TTL, ROSTER_TTL
+from prefetch import prefetch
+
+def raw_attributes(canvas_object):
+    # the JSON Canvas sent for canvas_object. canvasapi doesn't keep it, so it is rebuilt from the object's
+    # fields, leaving out the requester and the extra *_date datetimes canvasapi adds
+    found = {}
+    for key, value in vars(canvas_object).items():
+        if key.startswith('_'):
+            continue
+        try:
+            json.dumps(value)
+        except TypeError:
+            continue
+        found[key] = value
+    return found
+
+class Canvas_Lookup:
+    def __init__(self,canvas,cache = None):
+        self.canvas = canvas
+        self.cache = cache  # a Metadata_Cache, or None to always ask Canvas
+        self.requester = canvas._Canvas__requester
+        self.lock = threading.Lock()
+        self.memory = {}  # (kind, key) -> (object, came_from_canvas)
+        self.in_flight = {}  # (kind, key) -> Future for a fetch that is running right now
+
+    def get_course(self,course_id,refresh = False):
+        def fetch():
+            attributes = self.cached('course',course_id,COURSE_TTL,refresh)
+            if attributes is not None:
+                return Course(self.requester,attributes), False
+            course = self.canvas.get_course(course_id)
+            self.store('course',course_id,raw_attributes(course))
+            return course, True
+        return self.memo('course',course_id,fetch,refresh)
+
+    def get_assignment(self,course,assignment_id,refresh = False,fresh = False):
+        # fresh only accepts a copy that came from Canvas this session, not one saved to disk
+        key = f"{course.id}/{assignment_id}"
+        def fetch():
+            attributes = self.cached('assignment',key,ASSIGNMENT_TTL,refresh or fresh)
+            if attributes is not None:
+                return Assignment(self.requester,attributes), False
+            assignment = course.get_assignment(assignment_id)
+            self.store('assignment',key,raw_attributes(assignment))
+            return assignment, True
+        return self.memo('assignment',key,fetch,refresh,fresh)
+
+    def iter_students(self,course,refresh = False):
+        # yields students as each page arrives, the roster is only saved once it has been read to the end
+        key = ('roster',course.id)
+        with self.lock:
+            known = None if refresh else self.memory.get(key)
+            waiting = None if refresh else self.in_flight.get(key)
+            if known is None and waiting is None:
+                future = self.in_flight[key] = Future()
+        if known is not None:
+            yield from known[0]
+            return
+        if waiting is not None:
+            try:
+                students = waiting.result()[0]
+            except BaseException:
+                students = prefetch(course.get_users(enrollment_type = ['student']))  # the other read failed or was stopped part way
+            yield from students
+            return
+
+        try:
+            students = []
+            attributes = self.cached('roster',course.id,ROSTER_TTL,refresh)
+            if attributes is not None:
+                from_canvas = False
+                for student in attributes:
+                    students.append(User(self.requester,student))
+                    yield students[-1]
+            else:
+                from_canvas = True
+                for student in prefetch(course.get_users(enrollment_type = ['student'])):
+                    students.append(student)
+                    yield student
+                self.store('roster',course.id,[raw_attributes(student) for student in students])
+        except BaseException as e:
+            # includes GeneratorExit when a cancelled roster read stops early, nothing is remembered
+            self.finish(key,future,error = e)
+            raise
+        self.finish(key,future,(students,from_canvas))
+
+    def has_students(self,course):
+        # True when iter_students can answer without asking Canvas
+        with self.lock:
+            if ('roster',course.id) in self.memory or ('roster',course.id) in self.in_flight:
+                return True
+        return self.cached('roster',course.id,ROSTER_TTL,False) is not None
+
+    def remember_students(self,course,students):
+        # a roster read some other way (canvas_graphql.py's bulk reads), kept as if iter_students read it
+        self.store('roster',course.id,[raw_attributes(student) for student in students])
+        with self.lock:
+            self.memory[('roster',course.id)] = (students,True)
+
+    def memo(self,kind,key,fetch,refresh = False,fresh = False):
+        key = (kind,key)
+        with self.lock:
+            known = None if refresh else self.memory.get(key)
+            if known is not None and (known[1] or not fresh):
+                return known[0]
+            waiting = None if refresh or fresh else self.in_flight.get(key)
+            if waiting is None:
+                future = self.in_flight[key] = Future()
+        if waiting is not None:
+            return waiting.result()[0]
+        try:
+            result = fetch()
+        except BaseException as e:
+            self.finish(key,future,error = e)
+            raise
+        self.finish(key,future,result)
+        return result[0]
+
+    def finish(self,key,future,result = None,error = None):
+        with self.lock:
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
+            if error is None:
+                self.memory[key] = result
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def cached(self,kind,key,ttl,refresh):
+        if self.cache is None or refresh:
+            return None
+        return self.cache.get(kind,key,ttl)
+
+    def store(self,kind,key,data):
+        if self.cache is not None:
+            self.cache.put(kind,key,data)
@@ -20,25 +20,65 @@
 # DOCUMENTATION: Includes short tutorials on how to use the app
 # 
 # NOTES: Uses customtkinter to create the UI and canvasapi to access canvas. Packaged into a .exe with pyinstaller and auto-py-to-exe.
-# Almost everything to do with the actual assignment and submission transfer occurs in the run_script and 
-# copy_assignment functions within the main_app class. 
+# The actual assignment and submission transfer lives in transfer.py (Transfer_Engine), which run_script 
+# calls into. cli.py uses the same engine to run a manifest of transfers without the UI.
+#
+# STARTUP: the window is shown before anything slow happens. canvasapi and the modules built on it
+# (transfer, lookup) are imported where they are first needed, which is the token check that runs on a
+# worker thread as soon as the app opens, and the header shows the last user's name until it comes back.
 
 import os
-from canvasapi import Canvas, exceptions as c_exceptions
-from pathlib import Path
 from customtkinter import*
-from PIL import Image
 import tkinter as tk
-import re
+import time
 import webbrowser
+from background import Task, Task_Runner
+from metadata_cache import Metadata_Cache
+from search_index import Roster_Index
+from settings import CACHE_PATH, DEFAULT_TOKEN, CANVAS_URL, get_assignment_codes, get_course_codes, last_user_name, remember_user_name, student_number
+import tracing
 
-DEFAULT_TOKEN = 'mytoken.txt'  # Text file with your api token saved in the same directory as this script
-CANVAS_URL = "https://canvas.ubc.ca"
 DOCUMENTATION_LINK = "https://canvas.instructure.com/doc/api/courses.html"
 
 UBC_BLUE = "#002145"
 LIGHT_BLUE = "#6EC4E8"
 HOVER = "#0680A6"
+DOC_IMAGE_WIDTH = 400
+
+def resource_path(relative_path):
+    try:
+        # PyInstaller creates a temporary folder and stores the path in _MEIPASS
+        base_path = sys._MEIPASS
+    except AttributeError:
+        base_path = os.path.abspath(".")
+
+    return os.path.join(base_path, relative_path)
+
+# help screenshots and text, loaded the first time a Documentation tab shows them and kept for as long as
+# the app is open so reopening the help doesn't read or decode anything again
+doc_images = {}  # name -> (CTkImage, height) or None if there is no such picture
+doc_texts = {}  # file name -> text
+
+def load_doc_image(name):
+    if name not in doc_images:
+        from PIL import Image
+        try:
+            with Image.open(resource_path(name + ".png")) as image:
+                width, height = image.size
+                height = height/width * DOC_IMAGE_WIDTH
+                # kept at twice the shown size, enough for high dpi screens, rather than the full screenshot
+                image = image.resize((DOC_IMAGE_WIDTH * 2,round(height * 2)))
+            doc_images[name] = (CTkImage(light_image = image,size = (DOC_IMAGE_WIDTH,height)),height)
+        except (FileNotFoundError, tk.TclError):
+            print(f"No file found: {name}.png")
+            doc_images[name] = None
+    return doc_images[name]
+
+def load_doc_text(file_name):
+    if file_name not in doc_texts:
+        with open(resource_path(file_name),'r') as file:
+            doc_texts[file_name] = file.read()
+    return doc_texts[file_name]
 
 class main_app(CTk):
 
@@ -59,16 +99,24 @@ class main_app(CTk):
         self.title('Submission Transfer App')
 
         self.source_course_id = None
-        self.source_assignment_id = None
-        self.destination_course_id = None
+        self.source_assignment_ids = []  # one or more assignments, all from the source course
+        self.destination_course_ids = []  # more than one sends the same assignments to every course
 
         self.docs = None
+        self.runner = Task_Runner(self)  # every Canvas call goes through this so the window never freezes
+        self.task = None  # the Task of the latest run, cancelled if the window is closed while it's going
+        self.entry_requests = {'assignment': 0, 'course': 0}  # newest lookup per entry, older replies are ignored
 
         self.resizable(False,False)
         self.UI_setup()
         self.bindings()
 
         self.canvas = None
+        self.lookup = None
+        self.client = None  # async_canvas.Async_Canvas for runs, made by get_client
+        self.graphql = None  # canvas_graphql.Canvas_GraphQL, reads rosters and submissions in bulk for runs
+        self.metadata_cache = Metadata_Cache(CACHE_PATH)  # saved course/assignment/roster lookups from earlier sessions
+        self.protocol("WM_DELETE_WINDOW",self.on_close)
         self.get_token()
     
     def define_sizes(self):
@@ -81,7 +129,7 @@ class main_app(CTk):
         self.small_spacer_width = 10
         self.btns_height = 60
         self.box_width = (self.window_width - 3 * self.spacer_width) / 2
-        self.btn_width = (self.box_width - self.spacer_width) / 2
+        self.btn_width = (self.box_width - 2 * self.spacer_width) / 3
         self.inner_box_width = (self.box_width - 2*self.spacer_width)
         self.inputs_height = self.mainframe_height - 2 * self.spacer_width
         self.outputs_height = self.mainframe_height - 3 * self.spacer_width - self.btns_height
@@ -92,9 +140,9 @@ class main_app(CTk):
 
     def UI_setup(self):
         self.header = CTkFrame(self,self.window_width,self.header_height,fg_color="white",bg_color="white")
-        self.logo_image = CTkImage(light_image=Image.open(self.resource_path("ubc_header.png")),size=(round(768*0.588235),60))
-        self.logo_label = CTkLabel(self.header, image=self.logo_image, text="",fg_color="white",bg_color="white")
+        self.logo_label = CTkLabel(self.header,text="",height=60,fg_color="white",bg_color="white")
         self.logo_label.pack(pady=10,anchor="w",padx=30)
+        self.after_idle(self.load_logo)  # decoded once the window is up
         self.header.grid(sticky = "news",column = 0, row = 0)
         self.rowconfigure([0,3],minsize=self.header_height)
 
@@ -134,7 +182,7 @@ class main_app(CTk):
         self.source_assignment_entry = CTkEntry(self.inputs,width = self.column1_width,height=40,corner_radius = self.inner_corner_radius,
                                            text_color=UBC_BLUE,fg_color='white',
                                            placeholder_text_color=UBC_BLUE,
-                                           placeholder_text="Insert Assignment Link",
+                                           placeholder_text="Insert Assignment Link(s)",
                                            font = SMALL_FONT,border_width=0)
         self.source_assignment_entry.grid(column = 0, row = 1,sticky = "w")
         
@@ -170,7 +218,7 @@ class main_app(CTk):
         self.destination_course_entry = CTkEntry(self.outputs,width = self.column1_width,height=40,corner_radius = self.inner_corner_radius,
                                            text_color=UBC_BLUE,fg_color='white',bg_color='white',
                                            placeholder_text_color=UBC_BLUE,
-                                           placeholder_text="Insert Course Link",
+                                           placeholder_text="Insert Course Link(s)",
                                            font = SMALL_FONT,border_width=0)
         self.destination_course_entry.grid(column = 0, row = 1,sticky = "w")
         
@@ -211,26 +259,31 @@ class main_app(CTk):
                                  fg_color=UBC_BLUE,bg_color = 'white',corner_radius=0,
                                  font = ('Lato',30),text_color="white",hover_color=HOVER,
                                  command = self.run_script, state = "disabled")
-        self.run_btn.place(x = self.btn_width * 3/2 + self.spacer_width, rely = 0.5, relwidth = 1/2 - self.spacer_width/(2 * self.box_width), relheight = 1, anchor = CENTER)
-        self.disclaimer_btn = CTkButton(self.run_btn_frame,text="Documentation",
+        self.run_btn.place(x = self.btn_width * 5/2 + 2 * self.spacer_width, rely = 0.5, relwidth = self.btn_width / self.box_width, relheight = 1, anchor = CENTER)
+        self.dry_run_btn = CTkButton(self.run_btn_frame,text="Dry Run",
                                  fg_color=UBC_BLUE,bg_color = 'white',corner_radius=0,
                                  font = ('Lato',20),text_color="white",hover_color=HOVER,
+                                 command = self.dry_run, state = "disabled")
+        self.dry_run_btn.place(x = self.btn_width * 3/2 + self.spacer_width, rely = 0.5, relwidth = self.btn_width / self.box_width, relheight = 1, anchor = CENTER)
+        self.disclaimer_btn = CTkButton(self.run_btn_frame,text="Documentation",
+                                 fg_color=UBC_BLUE,bg_color = 'white',corner_radius=0,
+                                 font = ('Lato',18),text_color="white",hover_color=HOVER,
                                  width = 200, height = 60,command = lambda: self.open_docs(1))
-        self.disclaimer_btn.place(x = self.btn_width / 2, rely = 0.5, relwidth = (225)/470, relheight = 1, anchor = CENTER)
+        self.disclaimer_btn.place(x = self.btn_width / 2, rely = 0.5, relwidth = self.btn_width / self.box_width, relheight = 1, anchor = CENTER)
 
-    def resource_path(self,relative_path):
-        try:
-            # PyInstaller creates a temporary folder and stores the path in _MEIPASS
-            base_path = sys._MEIPASS
-        except AttributeError:
-            base_path = os.path.abspath(".")
+    def load_logo(self):
+        from PIL import Image
+        self.logo_image = CTkImage(light_image=Image.open(self.resource_path("ubc_header.png")),size=(round(768*0.588235),60))
+        self.logo_label.configure(image=self.logo_image)
 
-        return os.path.join(base_path, relative_path)
+    def resource_path(self,relative_path):
+        return resource_path(relative_path)
 
     def open_docs(self,index):
         if self.docs is None:
             self.docs = Documentation(self,index)
         else:
+            self.docs.show_tab(index)
             self.docs.focus()
         if index == 0:
             self.docs.grab_set()
@@ -258,56 +311,97 @@ class main_app(CTk):
         self.focus_set()
 
     def read_assignment_entry(self,event):
+        # takes one assignment link, or several from the same course separated by spaces or commas
         self.focus_set()
-        link = event.widget.get()
-        code = self.get_course_code(link, 'assignment')
-        if code[0]:
-            try:
-                course = self.canvas.get_course(code[1])
-                assignment = course.get_assignment(code[2])
-            except c_exceptions.ResourceDoesNotExist:
-                text = "   No course/assignment found"
-                self.source_course_id = None
-                self.source_assignment_id = None
-                self.enable_run_check()
-            except (c_exceptions.Unauthorized):
-                text = "   You don't have the priveledges to access this course"
-                self.source_course_id = None
-                self.source_assignment_id = None
-                self.enable_run_check()
-            else:
-                text = "   Course: " + course.name + \
-                     "\n   Assignment: " + assignment.name
-                self.source_course_id = code[1]
-                self.source_assignment_id = code[2]
-                self.enable_run_check()
+        request = self.new_entry_request('assignment')  # any lookup still going is out of date whatever this entry holds
+        codes = get_assignment_codes(event.widget.get())
+        self.source_course_id = None
+        self.source_assignment_ids = []
+        self.enable_run_check()
+        if self.lookup is None:
+            self.source_assignment_display.configure(text = "   Waiting for your access token to be checked")
+        elif not codes:
+            self.source_assignment_display.configure(text = "   This doesn't look like an assignment link to me")
+        elif len({course_id for course_id, assignment_id in codes}) > 1:
+            self.source_assignment_display.configure(text = "   All assignments need to be from the same course")
+        else:
+            course_id = codes[0][0]
+            assignment_ids = list(dict.fromkeys(assignment_id for course_id, assignment_id in codes))
+            self.source_assignment_display.configure(text = "   Loading...")
+            def fetch():
+                course = self.lookup.get_course(course_id)
+                return course, [self.lookup.get_assignment(course,assignment_id) for assignment_id in assignment_ids]
+            self.runner.submit(fetch,on_done = lambda result: self.on_assignment_found(request,course_id,assignment_ids,*result),
+                               on_error = lambda e: self.on_assignment_error(request,e))
+
+    def on_assignment_found(self,request,course_id,assignment_ids,course,assignments):
+        if request != self.entry_requests['assignment']:
+            return
+        if len(assignments) == 1:
+            names = "\n   Assignment: " + assignments[0].name
         else:
-            text = "   This doesn't look like an assignment link to me"
-            self.source_course_id = None
-            self.source_assignment_id = None
-            self.enable_run_check()
+            names = f"\n   {len(assignments)} Assignments: " + ", ".join(assignment.name for assignment in assignments)
+            if len(names) > 60:
+                names = names[:57] + "..."
+        self.source_assignment_display.configure(text = "   Course: " + course.name + names)
+        self.source_course_id = course_id
+        self.source_assignment_ids = assignment_ids
+        self.enable_run_check()
+
+    def on_assignment_error(self,request,error):
+        from canvasapi import exceptions as c_exceptions
+        if request != self.entry_requests['assignment']:
+            return
+        if isinstance(error,c_exceptions.ResourceDoesNotExist):
+            text = "   No course/assignment found"
+        elif isinstance(error,c_exceptions.Unauthorized):
+            text = "   You don't have the priveledges to access this course"
+        else:
+            text = "   Couldn't reach Canvas, try again"
         self.source_assignment_display.configure(text = text)
         
     def read_destination_course_entry(self,event):
         self.focus_set()
-        link = event.widget.get()
-        code = self.get_course_code(link,'course')
-        if (code[0]):
-            try:
-                course = self.canvas.get_course(code[1])
-                course_name = "   Course: " + course.name
-            except c_exceptions.ResourceDoesNotExist:
-                course_name = "   No course found"
-                self.destination_course_id = None
-                self.enable_run_check()
-            else:
-                self.destination_course_id = code[1]
-                self.enable_run_check()
+        request = self.new_entry_request('course')  # any lookup still going is out of date whatever this entry holds
+        codes = get_course_codes(event.widget.get())
+        self.destination_course_ids = []
+        self.enable_run_check()
+        if self.lookup is None:
+            self.destination_course_display.configure(text = "   Waiting for your access token to be checked")
+        elif codes:
+            self.destination_course_display.configure(text = "   Loading...")
+            self.runner.submit(lambda: [self.lookup.get_course(code) for code in codes],
+                               on_done = lambda courses: self.on_destination_found(request,codes,courses),
+                               on_error = lambda e: self.on_destination_error(request,e))
         else:
-            course_name = "   This doesn't look like a course link to me"
-            self.destination_course_id = None
-            self.enable_run_check()
-        self.destination_course_display.configure(text = course_name) 
+            self.destination_course_display.configure(text = "   This doesn't look like a course link to me")
+
+    def on_destination_found(self,request,codes,courses):
+        if request != self.entry_requests['course']:
+            return
+        if len(courses) == 1:
+            text = "   Course: " + courses[0].name
+        else:
+            text = f"   {len(courses)} Courses: " + ", ".join(course.name for course in courses)
+            if len(text) > 60:
+                text = text[:57] + "..."
+        self.destination_course_display.configure(text = text)
+        self.destination_course_ids = codes
+        self.enable_run_check()
+
+    def on_destination_error(self,request,error):
+        from canvasapi import exceptions as c_exceptions
+        if request != self.entry_requests['course']:
+            return
+        if isinstance(error,c_exceptions.ResourceDoesNotExist):
+            text = "   No course found"
+        else:
+            text = "   Couldn't reach Canvas, try again"
+        self.destination_course_display.configure(text = text)
+
+    def new_entry_request(self,entry):
+        self.entry_requests[entry] += 1
+        return self.entry_requests[entry]
     
     def handle_focus(self,event):
         if isinstance(event.widget,tk.Entry):
@@ -316,142 +410,192 @@ class main_app(CTk):
             self.focus_set()
 
     def enable_run_check(self):
-        if self.source_assignment_id and self.source_course_id and self.destination_course_id:
-            self.run_btn.configure(state = "normal")
+        if self.source_assignment_ids and self.source_course_id and self.destination_course_ids:
             self.choose_students.enable_all()
             self.choose_students.update_table()
-            print("normal")
         else: 
-            self.run_btn.configure(state = "disabled")
             self.choose_students.disable_all()
-            print("disabled")
-
-    def get_course_code(self,link,type):
-        course_pattern = r"(?<=courses/)(\d+)"
-        course_code = re.findall(course_pattern,link)
-        if type == "course" and course_code:
-            return (True,int(course_code[0]))
-        elif type == "assignment" and course_code:
-            assignment_pattern = r"(?<=assignments/)(\d+)"
-            assignment_code = re.findall(assignment_pattern,link)
-            if assignment_code:
-                return (True,int(course_code[0]),int(assignment_code[0]))
-        return (False, None)
-            
-    def get_token(self):
-        result, canvas = self.load_token()
-        if result:
-            self.canvas = canvas
-            self.user_name.configure(text = canvas.get_current_user().name)
+        self.update_run_buttons()
+
+    def update_run_buttons(self):
+        # Run and Dry Run wait for the student table to finish loading, until then the chosen students are
+        # only the rows that have streamed in so far
+        if self.source_assignment_ids and self.source_course_id and self.destination_course_ids and self.choose_students.table_ready:
+            self.run_btn.configure(state = "normal")
+            self.dry_run_btn.configure(state = "normal")
         else:
-            self.open_token_finder(result)
+            self.run_btn.configure(state = "disabled")
+            self.dry_run_btn.configure(state = "disabled")
 
-    def open_token_finder(self,result):
+    def get_token(self):
+        # checked on a worker thread so the window doesn't wait on Canvas, with whoever used the app last
+        # shown in the header in the meantime
+        self.user_name.configure(text = last_user_name())
+        self.check_token(DEFAULT_TOKEN)
+
+    def check_token(self,token_path,on_invalid = None):
+        def check():
+            from transfer import check_token
+            return check_token(token_path)
+        # anything check_token didn't expect means the token couldn't be checked, not that it is invalid
+        self.runner.submit(check,on_done = lambda result: self.on_token_checked(*result,token_path,on_invalid = on_invalid),
+                           on_error = lambda e: self.on_token_checked(3,None,None,token_path,on_invalid = on_invalid))
+
+    def on_token_checked(self,result,canvas,user,token_path,on_invalid = None):
+        if result == 2:
+            self.set_canvas(canvas,user)
+            return
+        self.user_name.configure(text = "")
+        if on_invalid is not None:
+            on_invalid(result)
+        else:
+            self.open_token_finder(result,token_path)
+
+    def set_canvas(self,canvas,user):
+        from canvas_graphql import Canvas_GraphQL
+        from lookup import Canvas_Lookup
+        self.canvas = canvas
+        self.client = None
+        self.graphql = Canvas_GraphQL(canvas)
+        self.lookup = Canvas_Lookup(canvas,self.metadata_cache)
+        self.user_name.configure(text = user.name)
+        remember_user_name(user.name)
+        if self.get_token_window is not None and self.get_token_window.winfo_exists():
+            self.get_token_window.destroy()
+
+    def get_client(self):
+        # the async client when aiohttp is installed, a run then submits every student at once rather than
+        # a few at a time on worker threads
+        from async_canvas import ASYNC_AVAILABLE, Async_Canvas
+        if self.client is None and ASYNC_AVAILABLE:
+            self.client = Async_Canvas(self.canvas)
+        return self.client
+
+    def open_token_finder(self,result,token_path = DEFAULT_TOKEN):
         if self.get_token_window is None or not self.get_token_window.winfo_exists():
-            self.get_token_window = Get_Token(result,self)  # create window if its None or destroyed
+            self.get_token_window = Get_Token(result,self,token_path)  # create window if its None or destroyed
             self.get_token_window.grab_set()
 
         else:
             self.get_token_window.focus()  # if window exists focus it
     
-    def load_token(self,token_path=DEFAULT_TOKEN):
-        if Path(token_path).exists() and Path(token_path).is_file():
-            with open(token_path, 'r') as token_file:
-                api_key = token_file.read()
-                canvas = Canvas(CANVAS_URL, api_key)
-                try:
-                    if canvas.get_current_user():  # check to see if api key is valid by getting the user associated to it
-                        return 2, canvas
-                except (c_exceptions.InvalidAccessToken, c_exceptions.ResourceDoesNotExist):
-                    return 1, None
-        return 0, None
-    
-    def copy_assignment(self,assignment_to_copy, destination_course,assignment_name):
-        assignment_params = {
-            "name": assignment_name,
-            "description": assignment_to_copy.description,
-            "points_possible": assignment_to_copy.points_possible,
-            "submission_types": ['online_upload'],  
-            "due_at": assignment_to_copy.due_at,
-            "unlock_at": assignment_to_copy.unlock_at,
-            "lock_at": assignment_to_copy.lock_at,
-            "published": True,
-            "allowed_extensions":assignment_to_copy.allowed_extensions
-        }
-
-        new_assignment = destination_course.create_assignment(assignment_params)
-        if new_assignment:
-            return new_assignment
-        else:
-            self.warning("Assignment not made")
-            return
-
     def warning(self,text):
         warning_window = Warning_Window(text,self)
         warning_window.grab_set()
 
+    def get_jobs(self):
+        # the transfers the current inputs describe, None if they can't be run as they are
+        from transfer import Transfer_Job
+        if (self.name_choice_var.get() == 1):
+            assignment_name = None
+        else: 
+            assignment_name = self.assignment_name_var.get()
+            if len(self.source_assignment_ids) > 1:
+                self.warning("A new name can only be used when transferring one assignment.")
+                return None
+
+        students = self.choose_students.get_chosen_students()
+        if not students:
+            self.warning("Choose at least one student to transfer.")
+            return None
+        return [Transfer_Job(self.source_course_id,assignment_id,destination_course_id,
+                             assignment_name = assignment_name,students = students)
+                for destination_course_id in self.destination_course_ids
+                for assignment_id in self.source_assignment_ids]
+
     def run_script(self):        
-        loading_screen = Loading_Done_Window(self)
-        loading_screen.grab_set()
-        source_course = self.canvas.get_course(self.source_course_id)
-        source_assignment = source_course.get_assignment(self.source_assignment_id, include = ["submission"])
-        destination_course = self.canvas.get_course(self.destination_course_id)
+        from transfer import Transfer_Engine
+        jobs = self.get_jobs()
+        if jobs is None:
+            return
+        engine = Transfer_Engine(self.canvas,warn = lambda text: self.runner.post(self.warning,text),lookup = self.lookup,
+                                 mode = "auto",  # a file Canvas won't take by id is uploaded again rather than lost
+                                 client = self.get_client(),graphql = self.graphql)
 
-        if self.run_checks(source_course,source_assignment,destination_course):
+        task = Task()
+        self.task = task
+        loading_screen = Loading_Done_Window(self,task)
+        loading_screen.grab_set()
+        def run(**kwargs):
+            with tracing.phase("run"):
+                return engine.run_many(jobs,**kwargs)
+        self.runner.submit(run,progress = lambda *counts: self.runner.post(loading_screen.progress,*counts),
+                           on_job = lambda index, job: self.runner.post(loading_screen.start_job,index,len(jobs),
+                                                                        len(self.destination_course_ids) == 1),
+                           cancel = task.cancel_event,task = task,
+                           on_done = lambda result: self.on_run_done(loading_screen,len(jobs),*result),
+                           on_error = lambda e: self.on_run_error(loading_screen,e))
+
+    def dry_run(self):
+        # shows what Run would do and roughly how long it would take, without changing anything in Canvas
+        from transfer import Transfer_Engine
+        jobs = self.get_jobs()
+        if jobs is None:
             return
+        engine = Transfer_Engine(self.canvas,warn = lambda text: self.runner.post(self.warning,text),lookup = self.lookup,
+                                 mode = "auto",  # a file Canvas won't take by id is uploaded again rather than lost
+                                 graphql = self.graphql)
+        plan_window = Plan_Window(self)
+        plan_window.grab_set()
+        def plan():
+            with tracing.phase("dry run"):
+                plans, failures = engine.plan_many(jobs)
+            return "\n\n".join([plan.summary() for plan in plans] + [f"{job} can't be transferred: {error}" for job, error in failures]
+                               + [engine.plan_summary(plans)])
+        self.runner.submit(plan,on_done = plan_window.show,
+                           on_error = lambda e: plan_window.show(f"Couldn't plan the transfer: {e}"))
+
+    def on_run_done(self,loading_screen,count,results,failures):
+        if not results:
+            self.on_run_error(loading_screen,failures[0][1])
+            return
+        if count == 1:
+            loading_screen.finished(results[0].link,results[0].summary())
+            return
+        submitted = sum(result.submitted for result in results)
+        summary = f"{len(results)} of {count} transfers, {submitted} submissions"
+        if len(self.destination_course_ids) > 1:
+            per_course = {}
+            for result in results:
+                per_course[result.job.destination_course_id] = per_course.get(result.job.destination_course_id,0) + result.submitted
+            summary += "\n" + ", ".join(f"{course_id}: {n}" for course_id, n in per_course.items())
+        if failures:
+            summary += f"\nFailed: {failures[0][1]}"
+        loading_screen.finished(f"{CANVAS_URL}/courses/{results[0].job.destination_course_id}/assignments",summary)
 
-        if (self.name_choice_var.get() == 1):
-            assignment_name = source_assignment.name
-        else: 
-            assignment_name = self.assignment_name_var.get()
-            if len(assignment_name) == 0:
-                self.warning("Assignment name cannot be blank.")
-                return
-
-        assignments_in_destination_course = destination_course.get_assignments()
-
-        assignment_name = self.get_assignment_name(assignment_name,0,assignments_in_destination_course)
-
-        submissions = source_assignment.get_submissions()
-        new_assignment = self.copy_assignment(source_assignment,destination_course,assignment_name)
-
-        students_chosen = self.choose_students.get_chosen_students()
-
-        if new_assignment:
-            for s in submissions:
-                if (s.user_id in students_chosen):
-                    attachments = s.attachments
-                    for a in attachments:
-                        submission_file_id = a.id
-
-                        submission = {  # ←↓ Your code had an incorrect indentation for this part.
-                            "user_id": s.user_id,
-                            "submission_type": 'online_upload',  # ← Changed to "online_upload" instead of "online_url"
-                            'file_ids': [submission_file_id]
-                        }
-                        new_assignment.submit(submission)
-        loading_screen.finished(f"{CANVAS_URL}/courses/{self.destination_course_id}/assignments/{new_assignment.id}")
-
-    def run_checks(self,source,assignment,destination):
-        if source.id == destination.id:
-            self.warning("Source and destination courses are the same course")
-            return True
-        elif assignment.submission_types != ['online_upload']:
-            self.warning("Assignment either does not accept or does not exclusively accept online uploads. This is required.")
-
-    def get_assignment_name(self,name,counter,assignments):
-        for assignment in assignments:
-            if (counter != 0 and name + f" ({counter})" == assignment.name) or (counter == 0 and name == assignment.name):
-                return self.get_assignment_name(name,counter+1,assignments)
-        if counter == 0:
-            return name
-        else: 
-            return name + f" ({counter})"
+    def on_close(self):
+        # closing stops a transfer that is still going, so that needs confirming
+        if self.task is not None and not self.task.future.done():
+            self.close_window = Close_Window_Warning(self)
+            self.close_window.grab_set()
+        else:
+            self.close()
+
+    def close(self):
+        # the worker threads aren't daemons, so they are cancelled and shut down rather than left running
+        if self.task is not None:
+            self.task.cancel()
+        self.runner.shutdown()
+        if self.client is not None:
+            self.client.shutdown()
+        self.destroy()
+
+    def on_run_error(self,loading_screen,error):
+        from transfer import Transfer_Cancelled, Transfer_Error
+        if isinstance(error,Transfer_Cancelled):
+            loading_screen.cancelled(str(error))
+            return
+        loading_screen.destroy()
+        if isinstance(error,Transfer_Error):
+            self.warning(str(error))
+        else:
+            self.warning(f"Transfer failed: {error}")
 
 class Get_Token(CTkToplevel):
-    def __init__(self,result,parent):
+    def __init__(self,result,parent,token_path = DEFAULT_TOKEN):
         super().__init__(parent)
         self.main = parent
+        self.token_path = token_path  # checked again by Retry
         self.title("Get Access Token")
         self.geometry("400x250")
         self.resizable(False,False)
@@ -459,6 +603,10 @@ class Get_Token(CTkToplevel):
         self.info = CTkLabel(self.mainframe,width=200,height=100,text="",text_color=UBC_BLUE,
                              font = ('Lato',20,'bold'),wraplength = 400*0.75)
         self.info.place(relx = 0.5,rely=0.33,relwidth = 0.75,relheight = 0.3,anchor = CENTER)
+        # only shown when Canvas couldn't be reached
+        self.retry = CTkButton(self.mainframe,corner_radius=0, text = "Retry",
+                               command=self.retry_token,bg_color=UBC_BLUE,fg_color=UBC_BLUE,
+                               hover_color=HOVER,font = SMALL_FONT, width = 170, height = 30)
         self.update_info(result)
         self.select_file = CTkButton(self.mainframe,corner_radius=0, text = "Get Access Token File",
                                      command=self.browse_files,bg_color=UBC_BLUE,fg_color=UBC_BLUE,
@@ -477,21 +625,26 @@ class Get_Token(CTkToplevel):
         self.close_window.grab_set()
 
     def update_info(self,result):
+        self.retry.place_forget()
         if result == 1:
             self.info.configure(text = "Access token is invalid.")
         elif result == 0:
             self.info.configure(text = "No token file found. \nPlease select a .txt file with your access token.")
+        elif result == 3:
+            self.info.configure(text = "Couldn't reach Canvas. \nCheck your internet connection and try again.")
+            self.retry.place(x = 200, y = 145, anchor = "n")
+
+    def retry_token(self):
+        self.retry.place_forget()
+        self.info.configure(text = "Checking access token...")
+        self.main.check_token(self.token_path,on_invalid = self.update_info)
     
     def browse_files(self):
         file_path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt")])
         if file_path:
-            result, canvas = self.main.load_token(file_path)
-            if result == 2:
-                self.main.canvas = canvas
-                self.main.user_name.configure(text = canvas.get_current_user().name)
-                self.destroy()
-            else:
-                self.update_info(result)
+            self.token_path = file_path
+            self.info.configure(text = "Checking access token...")
+            self.main.check_token(file_path,on_invalid = self.update_info)  # closes this window when it is valid
         else:
             self.update_info(0)
 
@@ -519,12 +672,35 @@ class Close_Token_Window_Warning(CTkToplevel):
         self.close_btn.place(relx = 0.7, rely = 0.7,relwidth = 0.3,relheight = 0.2,anchor=CENTER)
         
     def close(self):
-        self.parent.main.destroy()
+        self.parent.main.close()
 
     def go_back(self):
         self.parent.grab_set()
         self.destroy()
 
+class Close_Window_Warning(CTkToplevel):
+    def __init__(self,parent):
+        super().__init__(parent)
+        self.geometry("300x200")
+        self.title("Closing Program")
+
+        self.parent = parent
+
+        self.resizable(False,False)
+
+        self.mainframe = CTkFrame(self,fg_color=UBC_BLUE,bg_color=UBC_BLUE)
+        self.mainframe.place(relx=0.5,rely=0.5,relheight=1,relwidth=1,anchor = CENTER)
+        self.text = CTkLabel(self.mainframe,text = "A transfer is still running.\n\nClosing will cancel it. \nAre you sure?",font = ('Lato',16),text_color="white",wraplength=300*0.8,anchor="center")
+        self.text.place(relx = 0.5,rely = 0.3, relwidth = 0.8, relheight = 0.5,anchor = CENTER)
+        self.go_back_btn = CTkButton(self.mainframe, text = "Go Back", fg_color="white",
+                                     bg_color="white",text_color=UBC_BLUE,hover_color=HOVER,
+                                     corner_radius=0,font = SMALL_FONT,command=self.destroy)
+        self.go_back_btn.place(relx = 0.3, rely = 0.7,relwidth = 0.3,relheight = 0.2,anchor=CENTER)
+        self.close_btn = CTkButton(self.mainframe, text = "Close", fg_color="white",
+                                   bg_color="white",text_color=UBC_BLUE,hover_color=HOVER,
+                                   corner_radius=0,font = SMALL_FONT,command=self.parent.close)
+        self.close_btn.place(relx = 0.7, rely = 0.7,relwidth = 0.3,relheight = 0.2,anchor=CENTER)
+
 class Warning_Window(CTkToplevel):
     def __init__(self, warning, *args, **kwargs):
         super().__init__(*args,**kwargs)
@@ -533,7 +709,7 @@ class Warning_Window(CTkToplevel):
         self.title("Warning!")
         self.mainframe = CTkFrame(self,fg_color = "white",bg_color='white')
         self.mainframe.place(relx = 0.5,rely = 0.5, relwidth = 1, relheight = 1)
-        self.label = CTkLabel(self.mainframe,text = "warning",font = ('Lato',16),text_color=UBC_BLUE)
+        self.label = CTkLabel(self.mainframe,text = warning,font = ('Lato',16),text_color=UBC_BLUE,wraplength = 180)
         self.label.place(relx=0.5,rely=0.4,relheight = 0.6,relwidth = 0.9,anchor = CENTER)
         self.okay = CTkButton(self.mainframe,text = "Okay", text_color="white", corner_radius=0,bg_color=UBC_BLUE,
                               fg_color=UBC_BLUE, hover_color=HOVER,command = self.okay_click)
@@ -542,20 +718,47 @@ class Warning_Window(CTkToplevel):
     def okay_click(self):
         self.destroy()
 
+class Plan_Window(CTkToplevel):
+    def __init__(self,parent):
+        super().__init__(parent)
+        self.title("Dry Run")
+        self.geometry("520x360")
+        self.resizable(False,False)
+        self.mainframe = CTkFrame(self,bg_color=UBC_BLUE,fg_color=UBC_BLUE)
+        self.mainframe.place(relx=0.5,rely=0.5,relwidth=1,relheight=1,anchor=CENTER)
+        self.info = CTkTextbox(self.mainframe,corner_radius=0,fg_color='white',text_color=UBC_BLUE,
+                               font = ('Lato',14),wrap = "word")
+        self.info.insert("1.0","Working out the transfer...")
+        self.info.configure(state = "disabled")
+        self.info.place(relx = 0.5,rely = 0.42,relwidth = 0.9,relheight = 0.72,anchor = CENTER)
+        self.okay = CTkButton(self.mainframe,width = 150, height = 40, 
+                              corner_radius=0, text = "Okay",
+                              command=self.destroy,bg_color='white',fg_color='white',
+                              hover_color=HOVER,font = ('Lato',16),text_color=UBC_BLUE)
+        self.okay.place(relx = 0.5, y = 360 - 20 - 20,anchor = CENTER)
+
+    def show(self,text):
+        try:
+            self.info.configure(state = "normal")
+        except tk.TclError:
+            return  # closed before the plan was ready
+        self.info.delete("1.0",tk.END)
+        self.info.insert("1.0",text)
+        self.info.configure(state = "disabled")
+
 class Student_Choice_Frame(CTkFrame):
     def __init__(self,parent,main,width,height):
         super().__init__(parent,width = width,height = height,bg_color='white',fg_color='white')
         self.width = width
         self.height = height
         self.main = main
-        self.student_frames = []
-        self.headers = None
         self.table_ready = False
+        self.table_request = 0  # bumped whenever the table is reset so rosters still loading are dropped
         
 
         self.refresh_btn = CTkButton(self,text = "Refresh",
                                      bg_color=HOVER,fg_color=HOVER,corner_radius=0,
-                                     font = SMALL_FONT, command = self.update_table)
+                                     font = SMALL_FONT, command = self.refresh)
         self.refresh_btn.place(rely = 0, relx = 0, relwidth = 0.15, relheight = 0.1)
         self.select_all_btn = CTkButton(self,text = "Select All",
                                      bg_color=HOVER,fg_color=HOVER,corner_radius=0,
@@ -571,38 +774,124 @@ class Student_Choice_Frame(CTkFrame):
                                      text_color=UBC_BLUE,border_width=3,border_color=HOVER)
         self.search.place(rely = 0, relx = 0.6, relwidth = 0.4, relheight = 0.1)
         self.search.bind('<Return>',self.on_search_enter)
+        self.search.bind('<KeyRelease>',self.on_search_type)
         self.search.bind('<Button-1>',self.on_search_click)
 
-
+        self.table = Student_Table(self,self.width,self.height * 0.9)
+        self.table.place(relx = 0, rely = 0.1, relwidth = 1, relheight = 0.9)
         self.disable_all()
-        self.scroll_frame = CTkScrollableFrame(self, corner_radius = 0, fg_color='white',bg_color='white')
-        self.scroll_frame.place(relx = 0, rely = 0.1, relwidth = 1, relheight = 0.9)
         
-    def update_table(self):
+    def refresh(self):
+        # skips the saved rosters and asks Canvas again
+        self.table_ready = False
+        self.main.update_run_buttons()
+        self.update_table(refresh = True)
+
+    def update_table(self,refresh = False):
+        from transfer import Transfer_Engine
         self.on_search_click('e')
         if self.table_ready:
-            for frame in self.student_frames:
-                frame['frame'].pack()
+            self.table.search("")
             return
 
-        for frame in self.student_frames:
-            frame['frame'].destroy()
-        self.canvas = self.main.canvas
-        source_course = self.canvas.get_course(self.main.source_course_id)
-        destination_course = self.canvas.get_course(self.main.destination_course_id)
-        
-        if self.headers is None:
-            self.headers = self.add_headers(self.scroll_frame,self.width,30)
-    
-        students_a = source_course.get_users(enrollment_type = ['student'])
-        students_b = destination_course.get_users(enrollment_type = ['student'])
-        
-        cross_over_students = [student for student in students_a if student.id in [student.id for student in students_b]]
-
-        for i, student in enumerate(cross_over_students):
-            self.student_frames.append(self.add_student_frame(self.scroll_frame,student,self.width,30,i%2))
+        self.table.clear()
+        self.table.show_message("Loading students...")
+
+        self.table_request += 1
+        request = self.table_request
+        lookup = self.main.lookup
+        engine = Transfer_Engine(self.main.canvas,lookup = lookup)
+        source_course_id = self.main.source_course_id
+        destination_course_ids = self.main.destination_course_ids
+        def fetch():
+            with tracing.phase("load students"):
+                source_course = lookup.get_course(source_course_id,refresh)
+                destination_courses = [lookup.get_course(course_id,refresh) for course_id in destination_course_ids]
+                # rows are added as matches stream in, long before the rosters have finished loading
+                return engine.get_matched_students(source_course,destination_courses,refresh = refresh,
+                                                   on_match = lambda students: self.main.runner.post(self.add_students,request,students))
+        self.main.runner.submit(fetch,on_done = lambda students: self.on_students_loaded(request,students),
+                                on_error = lambda e: self.on_students_error(request,e))
+
+    def add_students(self,request,students):
+        if request != self.table_request:
+            return
+        self.table.add_students(students)
 
+    def on_students_loaded(self,request,cross_over_students):
+        if request != self.table_request:
+            return
+        if not self.table.rows:
+            self.table.show_message("No students are enrolled in both courses")
         self.table_ready = True
+        self.main.update_run_buttons()
+
+    def on_students_error(self,request,error):
+        if request != self.table_request:
+            return
+        self.table.show_message("Couldn't load students, press Refresh to try again")
+        self.table_ready = False
+        self.main.update_run_buttons()
+
+    def select_all(self):
+        self.table.set_all(True)
+
+    def deselect_all(self):
+        self.table.set_all(False)
+
+    def on_search_click(self,event):
+        self.search.delete(0,tk.END)
+
+    def on_search_enter(self,event):
+        self.main.focus()
+        self.on_search_type(event)
+
+    def on_search_type(self,event):
+        # filters straight from the roster index, no Canvas calls and no widgets rebuilt
+        self.table.search(self.search.get())
+
+    def enable_all(self):
+        self.refresh_btn.configure(state = "normal")
+        self.select_all_btn.configure(state = "normal")
+        self.deselect_all_btn.configure(state = "normal")
+        self.search.configure(state = "normal")
+    
+    def disable_all(self):
+        self.refresh_btn.configure(state = "disabled")
+        self.select_all_btn.configure(state = "disabled")
+        self.deselect_all_btn.configure(state = "disabled")
+        self.search.configure(state = "disabled")
+        self.table_ready = False
+        self.table_request += 1
+        self.table.clear()
+
+    def get_chosen_students(self):
+        return self.table.get_chosen()
+
+class Student_Table(CTkFrame):
+    # Scrolling list of students that only draws the rows in view. Which students are selected is kept in
+    # self.rows, and a small pool of row widgets is refilled as the list scrolls, so a 1500 student
+    # roster costs about the same number of widgets as a 10 student one.
+    def __init__(self,parent,width,height,row_height = 30):
+        super().__init__(parent,width = width,height = height,corner_radius=0,fg_color='white',bg_color='white')
+        self.width = width
+        self.row_height = row_height
+        self.rows = []  # {'student', 'student_num', 'selected'} for every matched student
+        self.index = Roster_Index()  # searches rows by name, student number and Canvas id
+        self.query = ""
+        self.visible = []  # indices into self.rows that pass the current search
+        self.top = 0  # index into self.visible of the first row drawn
+        self.slots = []  # recycled row widgets
+
+        self.headers = self.add_headers(self,self.width,30)
+        self.body = CTkFrame(self,corner_radius=0,fg_color='white',bg_color='white')
+        self.scrollbar = CTkScrollbar(self,command = self.on_scrollbar,button_color=HOVER,button_hover_color=UBC_BLUE)
+        self.scrollbar.pack(side = RIGHT,fill = Y)
+        self.body.pack(side = LEFT,fill = BOTH,expand = True)
+        self.message = CTkLabel(self.body,text = "",font = SMALL_FONT,text_color=UBC_BLUE)
+
+        self.body.bind('<Configure>',lambda event: self.fill_pool())
+        self.bind_scroll(self.body)
 
     def add_headers(self,parent,width,height):
         headers = CTkFrame(parent, width = width, height = height, 
@@ -620,115 +909,223 @@ class Student_Choice_Frame(CTkFrame):
                               text_color=UBC_BLUE, fg_color='white',bg_color='white',anchor='w')
         student_num_label.place(relx = 0.75, rely = 0, relwidth = 0.4, relheight = 1)
 
-        headers.pack()
+        headers.pack(side = TOP,fill = X)
 
         return headers
 
-    def add_student_frame(self,parent,student,width,height,grey_or_white):
-        if grey_or_white == 0:
-            colour = "#dddddd"
-        else:
-            colour = "white"
-        frame = CTkFrame(parent, width = width, height = height, 
+    def add_slot(self):
+        # one reusable row, filled in with whichever student is scrolled into its position
+        colour = "white"
+        frame = CTkFrame(self.body, width = self.width, height = self.row_height, 
                          corner_radius=0, fg_color=colour, bg_color=colour)
-        
-        
+        slot = {'frame': frame, 'row': None, 'colour': colour}
 
         check_box = CTkCheckBox(frame, width = self.width * 0.15, height = self.width * 0.08, checkbox_height=24,
                                 checkbox_width=24,checkmark_color=HOVER,
                                 fg_color=colour, bg_color=colour,text = "",hover_color = HOVER, hover = True,
-                                corner_radius=0,border_color=HOVER,onvalue = 1, offvalue = 0)
+                                corner_radius=0,border_color=HOVER,onvalue = 1, offvalue = 0,
+                                command = lambda: self.on_check(slot))
         check_box.place(relx = 0.05,rely = 0, relwidth = 0.07, relheight = 0.95)
-        check_box.select()
 
         line1 = CTkLabel(frame,text = "", corner_radius=0,fg_color=HOVER,bg_color=HOVER)
         line1.place(relx = 0.2,rely = 0,relheight = 1,relwidth = 0.002)
 
-        name_label = CTkLabel(frame, font = self.font, text = student.name,
+        name_label = CTkLabel(frame, font = SMALL_FONT, text = "",
                               text_color=UBC_BLUE, fg_color=colour,bg_color=colour,anchor='w')
         name_label.place(relx = 0.25, rely = 0, relwidth = 0.45, relheight = 1)
         
-        line2 = CTkLabel(frame,height = height,text = "", corner_radius=0,fg_color=HOVER,bg_color=HOVER)
+        line2 = CTkLabel(frame,height = self.row_height,text = "", corner_radius=0,fg_color=HOVER,bg_color=HOVER)
         line2.place(relx = 0.7,rely = 0,relheight = 1,relwidth = 0.002)
 
-        if hasattr(student,'sis_user_id'):
-            if student.sis_user_id is not None:
-                num = student.sis_user_id
-            else:
-                num = student.id
-        else:
-            num = student.id
-
-        student_num_label = CTkLabel(frame,width = self.width * 0.4, height = 30, font = self.font, text = num,
+        student_num_label = CTkLabel(frame,width = self.width * 0.4, height = 30, font = SMALL_FONT, text = "",
                               text_color=UBC_BLUE, fg_color=colour,bg_color=colour,anchor='w')
         student_num_label.place(relx = 0.75, rely = 0, relwidth = 0.4, relheight = 1)
 
-        frame.pack()
-
-        return {'frame' : frame, 'check_box' : check_box, 'student' : student, 'student_num' : num}
-
-    def select_all(self):
-        for frame in self.student_frames:
-            frame['check_box'].select()
-
-    def deselect_all(self):
-        for frame in self.student_frames:
-            frame['check_box'].deselect()
-
-    def on_search_click(self,event):
-        self.search.delete(0,tk.END)
-
-    def on_search_enter(self,event):
-        self.main.focus()
-        search = self.search.get()
-        self.update_table()
-        for frame in self.student_frames:
-            if not (search in frame['student'].name or search == str(frame['student_num']) or search == str(frame['student'].id)):
-                frame['frame'].pack_forget()
-
-    def enable_all(self):
-        self.refresh_btn.configure(state = "normal")
-        self.select_all_btn.configure(state = "normal")
-        self.deselect_all_btn.configure(state = "normal")
-        self.search.configure(state = "normal")
-    
-    def disable_all(self):
-        self.refresh_btn.configure(state = "disabled")
-        self.select_all_btn.configure(state = "disabled")
-        self.deselect_all_btn.configure(state = "disabled")
-        self.search.configure(state = "disabled")
-        self.table_ready = False
-        for frame in self.student_frames:
-            frame['frame'].destroy()
-        if self.headers is not None:
-            self.headers.destroy()
-        self.headers = None
-
-    def get_chosen_students(self):
-        chosen_students = []
-        for frame in self.student_frames:
-            if frame['check_box'].get() == 1:
-                chosen_students.append(frame['student'].id)
-        return chosen_students
+        slot.update({'check_box': check_box, 'name': name_label, 'student_num': student_num_label})
+        for widget in (frame,check_box,line1,name_label,line2,student_num_label):
+            self.bind_scroll(widget)
+        self.slots.append(slot)
+
+    def fill_pool(self):
+        while len(self.slots) < self.page_size() + 1:
+            self.add_slot()
+        self.render()
+
+    def page_size(self):
+        return max(1,self.body.winfo_height() // self.row_height)
+
+    def render(self):
+        for i, slot in enumerate(self.slots):
+            n = self.top + i
+            if n >= len(self.visible):
+                slot['row'] = None
+                slot['frame'].place_forget()
+                continue
+            index = self.visible[n]
+            row = self.rows[index]
+            colour = "#dddddd" if n % 2 == 0 else "white"
+            if slot['colour'] != colour:
+                slot['colour'] = colour
+                slot['frame'].configure(fg_color = colour,bg_color = colour)
+                slot['check_box'].configure(fg_color = colour,bg_color = colour)
+                slot['name'].configure(fg_color = colour,bg_color = colour)
+                slot['student_num'].configure(fg_color = colour,bg_color = colour)
+            if slot['row'] != index:
+                slot['row'] = index
+                slot['name'].configure(text = row['student'].name)
+                slot['student_num'].configure(text = row['student_num'])
+            if row['selected']:
+                slot['check_box'].select()
+            else:
+                slot['check_box'].deselect()
+            slot['frame'].place(x = 0,y = i * self.row_height,relwidth = 1)
+        total = len(self.visible)
+        if total:
+            self.scrollbar.set(self.top / total,min(1,(self.top + self.page_size()) / total))
+        else:
+            self.scrollbar.set(0,1)
+
+    def scroll_to(self,top):
+        self.top = max(0,min(top,len(self.visible) - self.page_size()))
+        self.render()
+
+    def on_scrollbar(self,*args):
+        if args[0] == 'moveto':
+            self.scroll_to(round(float(args[1]) * len(self.visible)))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.page_size()
+            self.scroll_to(self.top + amount)
+
+    def on_wheel(self,event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.top - 3)
+        else:
+            self.scroll_to(self.top + 3)
+
+    def bind_scroll(self,widget):
+        widget.bind('<MouseWheel>',self.on_wheel)
+        widget.bind('<Button-4>',self.on_wheel)
+        widget.bind('<Button-5>',self.on_wheel)
+
+    def on_check(self,slot):
+        if slot['row'] is not None:
+            self.rows[slot['row']]['selected'] = slot['check_box'].get() == 1
+
+    def add_students(self,students):
+        self.message.place_forget()
+        for student in students:
+            row = {'student': student,'student_num': student_number(student),'selected': True}
+            self.rows.append(row)
+            self.index.add(len(self.rows) - 1,student.name,row['student_num'],student.id)
+        if self.query:
+            self.search(self.query,keep_position = True)
+        else:
+            self.visible = list(range(len(self.rows)))
+            self.render()
+
+    def search(self,query,keep_position = False):
+        self.query = query
+        matches = self.index.search(query)
+        if matches is None:
+            self.visible = list(range(len(self.rows)))
+        else:
+            self.visible = sorted(matches)
+        if not keep_position:
+            self.top = 0
+        self.render()
+
+    def set_all(self,selected):
+        for row in self.rows:
+            row['selected'] = selected
+        self.render()
+
+    def get_chosen(self):
+        return [row['student'].id for row in self.rows if row['selected']]
+
+    def clear(self):
+        self.rows = []
+        self.index.clear()
+        self.query = ""
+        self.visible = []
+        self.top = 0
+        self.message.place_forget()
+        self.render()
+
+    def show_message(self,text):
+        self.message.configure(text = text)
+        self.message.place(relx = 0.5,y = 40,anchor = CENTER)
 
 class Loading_Done_Window(CTkToplevel):
-    def __init__(self,parent):
+    def __init__(self,parent,task = None):
         super().__init__(parent)
         self.main = parent
-        self.title("Finished")
+        self.task = task
+        self.title("Transferring")
         self.geometry("360x200")
         self.resizable(False,False)
         self.mainframe = CTkFrame(self,bg_color=UBC_BLUE,fg_color=UBC_BLUE)
         self.info = CTkLabel(self.mainframe,width=200,height=100,text="Loading...",text_color='white',
                              font = ('Lato',30,'bold'),wraplength = 400*0.75)
-        self.info.place(relx = 0.5,rely=0.33,relwidth = 0.75,relheight = 0.3,anchor = CENTER)
+        self.info.place(relx = 0.5,rely=0.2,relwidth = 0.75,relheight = 0.3,anchor = CENTER)
+
+        self.progress_bar = CTkProgressBar(self.mainframe,corner_radius=0,fg_color='white',progress_color=LIGHT_BLUE)
+        self.progress_bar.set(0)
+        self.progress_bar.place(relx = 0.5,rely = 0.42,relwidth = 0.85,anchor = CENTER)
+
+        self.stats = CTkLabel(self.mainframe,text = "Getting submissions...",text_color='white',font = ('Lato',14),wraplength = 340)
+        self.stats.place(relx = 0.5,rely = 0.57,anchor = CENTER)
+
+        self.cancel_btn = CTkButton(self.mainframe,width = 150, height = 40, 
+                                     corner_radius=0, text = "Cancel",
+                                     command=self.cancel,bg_color='white',fg_color='white',
+                                     hover_color=HOVER,font = ('Lato',16),text_color=UBC_BLUE)
+        self.cancel_btn.place(relx = 0.5, y = 200 - 20 - 20,anchor = CENTER)
         
         self.mainframe.place(relx=0.5,rely=0.5,relwidth=1,relheight=1,anchor=CENTER)
+        self.protocol("WM_DELETE_WINDOW",self.cancel)
 
         self.link = CANVAS_URL
-
-    def finished(self,link):
+        self.start = time.perf_counter()
+
+    def start_job(self,index,count,restart = True):
+        # restart is False when several destination courses run at once and progress is their total
+        if count > 1:
+            self.title(f"Transferring {index + 1} of {count}")
+        if restart:
+            self.progress_bar.set(0)
+            self.start = time.perf_counter()
+
+    def progress(self,done,total,submitted):
+        self.info.configure(text = "Transferring...")
+        self.progress_bar.set(done / total if total else 1)
+        elapsed = max(time.perf_counter() - self.start,1e-6)
+        text = f"{done} / {total} students   {submitted / elapsed:.1f} submissions/s"
+        if 0 < done < total:
+            eta = (total - done) * elapsed / done
+            text += f"\nAbout {int(eta // 60)}m {int(eta % 60):02d}s left"
+        self.stats.configure(text = text)
+
+    def cancel(self):
+        if self.task is not None and not self.task.cancelled:
+            self.task.cancel()
+            self.info.configure(text = "Cancelling...")
+            self.cancel_btn.configure(state = "disabled")
+
+    def cancelled(self,text):
+        self.info.configure(text = "Cancelled")
+        self.stats.configure(text = text)
+        self.cancel_btn.configure(text = "Close",state = "normal",command = self.destroy)
+        self.protocol("WM_DELETE_WINDOW",self.destroy)
+
+    def finished(self,link,summary = ""):
+        self.title("Finished")
         self.info.configure(text = "Done!")
+        self.progress_bar.place_forget()
+        self.cancel_btn.place_forget()
+        self.stats.configure(text = summary)
+        self.protocol("WM_DELETE_WINDOW",self.destroy)
         self.link = link
         self.link_btn = CTkButton(self.mainframe,width = 150, height = 60, 
                                      corner_radius=0, text = "Open Assignment",
@@ -769,28 +1166,26 @@ class Documentation(CTkToplevel):
                              corner_radius=0,text_color='white',
                              border_width=0,width = width, height = height - 80)
         tabview.pack(fill = BOTH)
-
-        access_code_tab = tabview.add("Get Access Code")
-        course_link = tabview.add("Get Course Link")
-        assignment_link = tabview.add("Get Assignment Link")
-        download_code_tab = tabview.add("Download Source Code")
-
-        
-        
-        self.create_tab(course_link,'course_link.txt','Get Course Link')
-        self.create_tab(assignment_link,'assignment_link.txt','Get Assignment Link')
-        
-        self.create_download_tab(download_code_tab)
-        self.create_access_code_tab(access_code_tab)
+        self.tabview = tabview
+
+        # each tab is only filled in the first time it is shown
+        self.tabs = ["Get Access Code","Get Course Link","Get Assignment Link","Download Source Code"]
+        self.builders = {
+            "Get Access Code": self.create_access_code_tab,
+            "Get Course Link": lambda frame: self.create_tab(frame,'course_link.txt','Get Course Link'),
+            "Get Assignment Link": lambda frame: self.create_tab(frame,'assignment_link.txt','Get Assignment Link'),
+            "Download Source Code": self.create_download_tab,
+        }
+        for tab in self.tabs:
+            tabview.add(tab)
+        tabview.configure(command = self.on_tab_change)
 
         tabview._segmented_button._buttons_dict['Get Access Code'].configure(width = 160, height = 40,font = ('Lato',16))
         tabview._segmented_button._buttons_dict['Get Course Link'].configure(width = 160, height = 40,font = ('Lato',16))
         tabview._segmented_button._buttons_dict['Get Assignment Link'].configure(width = 200, height = 40,font = ('Lato',16))
         tabview._segmented_button._buttons_dict['Download Source Code'].configure(width = 220, height = 40,font = ('Lato',16))
 
-
-        tabs = ["Get Access Code","Get Course Link","Get Assignment Link","Download Source Code"]
-        tabview.set(tabs[self.index])
+        self.show_tab(self.index)
 
         bottom_frame = CTkFrame(self,fg_color=UBC_BLUE,bg_color=UBC_BLUE)
         bottom_frame.pack(fill = BOTH)
@@ -799,7 +1194,15 @@ class Documentation(CTkToplevel):
                           fg_color='white',bg_color='white',hover_color=HOVER,command = self.on_closing,
                           corner_radius=0)
         close.pack(pady = (0,20), padx = 20, side = RIGHT)
-        
+
+    def show_tab(self,index):
+        self.tabview.set(self.tabs[index])
+        self.on_tab_change()
+
+    def on_tab_change(self):
+        name = self.tabview.get()
+        if name in self.builders:
+            self.builders.pop(name)(self.tabview.tab(name))
 
     def create_access_code_tab(self,parent):
         header = CTkLabel(parent, fg_color = UBC_BLUE,bg_color=UBC_BLUE,corner_radius=0,
@@ -844,9 +1247,8 @@ class Documentation(CTkToplevel):
         words5.pack(padx = 20, pady = 20,fill = BOTH,expand = True)
 
     def create_tab(self,parent,file_name,name):
-        with open(self.main.resource_path(file_name),'r') as file:
-            text = file.read()
-        
+        text = load_doc_text(file_name)
+
         header = CTkLabel(parent, fg_color = UBC_BLUE,bg_color=UBC_BLUE,corner_radius=0,
                           text = name, font = ('Lato',30),text_color='white',anchor='w')
         header.pack(padx = 20, pady = (20,10),fill = X)
@@ -862,14 +1264,10 @@ class Documentation(CTkToplevel):
         self.add_image(name,scrollable)
 
     def add_image(self,name,frame):
-        try:
-            image = Image.open(self.main.resource_path(name + ".png"))
-            width, height = image.size
-            image = CTkImage(light_image = image,size = (400,height/width * 400))
-        except (FileNotFoundError, tk.TclError):
-            print(f"No file found: {name}.png")
-        else:
-            label = CTkLabel(frame, image = image,text="",width = 400, height = height/width * 400)
+        loaded = load_doc_image(name)
+        if loaded is not None:
+            image, height = loaded
+            label = CTkLabel(frame, image = image,text="",width = DOC_IMAGE_WIDTH, height = height)
             label.pack(pady=20)
 
     def create_download_tab(self,frame):
@@ -890,10 +1288,9 @@ class Documentation(CTkToplevel):
         save_path = filedialog.asksaveasfilename(defaultextension=".txt",
                                              filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
         if save_path:
-            with open(self.resource_path('code_base.txt'), 'r') as file:
-                file_content = file.read()
-            
-            with open(self.resource_path(save_path), 'w') as file:
+            file_content = load_doc_text('code_base.txt')
+
+            with open(save_path, 'w') as file:
                 file.write(file_content)
     
     def on_closing(self):
@@ -903,5 +1300,9 @@ class Documentation(CTkToplevel):
         self.destroy()
 
 if __name__ == "__main__":
+    tracing.start_from_env()  # set COPY_SUBMISSIONS_TRACE to a folder to get a trace of the session
     app = main_app()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
+    summary = tracing.finish()
+    if summary is not None:
+        print(summary)
\ No newline at end of file
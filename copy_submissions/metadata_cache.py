@@ -0,0 +1,38 @@
+# ______METADATA CACHE______
+#
+# SQLite file under the user's home folder holding the Canvas courses, assignments and student rosters the
+# app has already looked up, so opening the app again against the same courses doesn't have to wait on
+# canvas.ubc.ca. Entries are the raw JSON Canvas sent and expire after a time to live; the Refresh
+# button skips the cache and writes fresh copies.
+
+import json
+import sqlite3
+import threading
+import time
+
+COURSE_TTL = 24 * 60 * 60
+ASSIGNMENT_TTL = 60 * 60
+ROSTER_TTL = 60 * 60
+
+class Metadata_Cache:
+    def __init__(self,path):
+        path.parent.mkdir(parents = True,exist_ok = True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(path),check_same_thread = False)
+        with self.lock, self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS entries (kind TEXT, key TEXT, fetched REAL, data TEXT, PRIMARY KEY (kind, key))")
+
+    def get(self,kind,key,ttl):
+        with self.lock:
+            row = self.db.execute("SELECT fetched, data FROM entries WHERE kind = ? AND key = ?",(kind,str(key))).fetchone()
+        if row is None or time.time() - row[0] > ttl:
+            return None
+        return json.loads(row[1])
+
+    def put(self,kind,key,data):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",(kind,str(key),time.time(),json.dumps(data)))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,336 @@
+# ______MOCK CANVAS______
+#
+# Local stand-in for the parts of the Canvas API this app uses, for benchmark.py and for trying changes
+# without touching canvas.ubc.ca. It serves, under /api/v1/:
+#   users/self, courses/:id, courses/:id/users (and search_users), courses/:id/assignments (list and create),
+#   courses/:id/assignments/:id, courses/:id/students/submissions, courses/:id/assignments/:id/submissions
+#   (submit) and the submission file upload used by reupload.py,
+# plus /files/:id/download for the source attachments and /api/graphql for canvas_graphql.py's bulk
+# query (Mock_Config.graphql = False answers it with an error the way an older Canvas would). Point a
+# Canvas handle at Mock_Canvas.url with any token. Responses are paginated with Link headers like Canvas,
+# and carry X-Request-Cost and X-Rate-Limit-Remaining from a leaky bucket that answers 403 "Rate Limit
+# Exceeded" when it runs dry.
+#
+# Mock_Config sets the added latency, largest page, rate limit and how often requests fail with a 500.
+# The data is one source course (id 1) with an assignment (id 1) every student has submitted a file to,
+# and a destination course (id 2) that shares most of the source course's students.
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+SOURCE_COURSE = 1
+DESTINATION_COURSE = 2
+SOURCE_ASSIGNMENT = 1
+
+class Mock_Config:
+    def __init__(self,latency = 0.02,jitter = 0.01,max_page_size = 100,bucket = 700,leak_rate = 10,cost = 0.1,
+                 failure_rate = 0,file_size = 4096,graphql = True):
+        self.latency = latency  # seconds added to every response, plus up to jitter more
+        self.jitter = jitter
+        self.max_page_size = max_page_size  # per_page above this is cut down, as Canvas does at 100
+        self.bucket = bucket  # rate limit bucket size, None turns rate limiting off
+        self.leak_rate = leak_rate  # how much of the bucket refills per second
+        self.cost = cost  # taken from the bucket by each request
+        self.failure_rate = failure_rate  # chance of any request failing with a 500
+        self.file_size = file_size  # bytes in each submitted file
+        self.graphql = graphql  # False fails every GraphQL query, so callers have to fall back to REST
+
+class Mock_Data:
+    def __init__(self,students,overlap = 0.9,existing_assignments = 20,attachments = 1):
+        # students in the source course, overlap of them also in the destination along with some others
+        self.lock = threading.Lock()
+        self.users = {}
+        for i in range(1,students + int(students * (1 - overlap)) + 1):
+            self.users[i] = {'id': i,'name': f"Student {i}",'sortable_name': f"{i}, Student",
+                             'short_name': f"Student {i}",'sis_user_id': f"{10000000 + i}",'login_id': f"student{i}"}
+        ids = sorted(self.users)
+        shared = int(students * overlap)
+        self.rosters = {SOURCE_COURSE: ids[:students],DESTINATION_COURSE: ids[:shared] + ids[students:]}
+        self.courses = {course_id: {'id': course_id,'name': f"Course {course_id}",'course_code': f"MOCK {course_id}"}
+                        for course_id in self.rosters}
+        self.assignments = {course_id: {} for course_id in self.courses}
+        self.add_assignment(SOURCE_COURSE,{'name': "Assignment 1",'submission_types': ['online_upload']})
+        for i in range(existing_assignments):
+            # names that collide with the copied assignment's, so name resolution has work to do
+            self.add_assignment(DESTINATION_COURSE,{'name': "Assignment 1" + (f" ({i})" if i else "")})
+        self.files = {}
+        self.submissions = {}  # (assignment id, user id) -> submission
+        for user_id in self.rosters[SOURCE_COURSE]:
+            files = [self.add_file(user_id) for n in range(attachments)]
+            self.submissions[(SOURCE_ASSIGNMENT,user_id)] = self.submission(SOURCE_ASSIGNMENT,user_id,files)
+        self.uploads = {}  # upload id -> file waiting to be uploaded
+
+    def add_assignment(self,course_id,params):
+        with self.lock:
+            assignment_id = sum(len(assignments) for assignments in self.assignments.values()) + 1
+            assignment = {'id': assignment_id,'course_id': course_id,'name': "Unnamed",'description': "",
+                          'points_possible': 10,'submission_types': ['online_upload'],'due_at': None,
+                          'unlock_at': None,'lock_at': None,'published': True,'allowed_extensions': []}
+            assignment.update(params)
+            self.assignments[course_id][assignment_id] = assignment
+            return assignment
+
+    def add_file(self,user_id,size = None,name = None):
+        with self.lock:
+            file_id = len(self.files) + 1
+            self.files[file_id] = {'id': file_id,'display_name': name or f"submission_{user_id}.pdf",
+                                   'filename': name or f"submission_{user_id}.pdf",'content-type': "application/pdf",
+                                   'size': size,'user_id': user_id}
+            return self.files[file_id]
+
+    def submission(self,assignment_id,user_id,files):
+        return {'id': assignment_id * 1000000 + user_id,'assignment_id': assignment_id,'user_id': user_id,
+                'submission_type': 'online_upload','workflow_state': "submitted",'attachments': files}
+
+class Mock_Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self,address,data,config):
+        super().__init__(address,Mock_Handler)
+        self.data = data
+        self.config = config
+        self.lock = threading.Lock()
+        self.used = 0.0  # rate limit bucket used, leaks at config.leak_rate
+        self.last_leak = time.monotonic()
+        self.requests = 0
+        self.throttled = 0
+        self.failed = 0
+
+    def charge(self):
+        # takes one request's cost from the bucket, returns (allowed, what is left in the bucket)
+        config = self.config
+        with self.lock:
+            self.requests += 1
+            if config.bucket is None:
+                return True, None
+            now = time.monotonic()
+            self.used = max(0.0,self.used - (now - self.last_leak) * config.leak_rate)
+            self.last_leak = now
+            if self.used + config.cost > config.bucket:
+                self.throttled += 1
+                return False, 0.0
+            self.used += config.cost
+            return True, config.bucket - self.used
+
+class Mock_Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keeps connections alive like Canvas
+
+    routes = [
+        ("GET",r"users/self","current_user"),
+        ("GET",r"courses/(\d+)","get_course"),
+        ("GET",r"courses/(\d+)/users","get_users"),
+        ("GET",r"courses/(\d+)/search_users","get_users"),  # what canvasapi's Course.get_users calls
+        ("GET",r"courses/(\d+)/assignments","get_assignments"),
+        ("POST",r"courses/(\d+)/assignments","create_assignment"),
+        ("GET",r"courses/(\d+)/assignments/(\d+)","get_assignment"),
+        ("GET",r"courses/(\d+)/students/submissions","get_submissions"),
+        ("POST",r"courses/(\d+)/assignments/(\d+)/submissions","submit"),
+        ("POST",r"courses/(\d+)/assignments/(\d+)/submissions/(\d+)/files","start_upload"),
+    ]
+
+    def log_message(self,format,*args):
+        pass
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def handle_request(self,method):
+        config = self.server.config
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self.params = parse_qs(parts.query)
+        if self.headers.get("Content-Type","").startswith("application/x-www-form-urlencoded"):
+            self.params.update(parse_qs(body.decode()))
+        time.sleep(config.latency + random.random() * config.jitter)
+
+        if parts.path.startswith("/files/"):
+            return self.download(parts.path)
+        if parts.path.startswith("/upload/"):
+            return self.finish_upload(parts.path,body)
+
+        allowed, remaining = self.server.charge()
+        self.rate_headers = {'X-Request-Cost': str(config.cost)}
+        if remaining is not None:
+            self.rate_headers['X-Rate-Limit-Remaining'] = f"{remaining:.1f}"
+        if not allowed:
+            return self.send(403,None,text = "403 Forbidden (Rate Limit Exceeded)")
+        if random.random() < config.failure_rate:
+            with self.server.lock:
+                self.server.failed += 1
+            return self.send(500,{'errors': [{'message': "Injected failure"}]})
+
+        if parts.path == "/api/graphql" and method == "POST":
+            return self.graphql(json.loads(body or b"{}"))
+        endpoint = parts.path[len("/api/v1/"):] if parts.path.startswith("/api/v1/") else None
+        for route_method, pattern, name in self.routes:
+            match = re.fullmatch(pattern,endpoint or "")
+            if match and route_method == method:
+                return getattr(self,name)(*[int(group) for group in match.groups()])
+        self.send(404,{'errors': [{'message': "The specified resource does not exist."}]})
+
+    def send(self,status,payload,headers = None,text = None):
+        body = text.encode() if text is not None else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type","text/plain" if text is not None else "application/json")
+        self.send_header("Content-Length",str(len(body)))
+        for name, value in {**getattr(self,'rate_headers',{}),**(headers or {})}.items():
+            self.send_header(name,value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def param(self,name,default = None):
+        values = self.params.get(name)
+        return values[0] if values else default
+
+    def send_page(self,items):
+        # one page of items with Canvas's Link header, using ?page= and ?per_page=
+        per_page = min(int(self.param('per_page',10)),self.server.config.max_page_size)
+        page = int(self.param('page',1))
+        last = max(1,-(-len(items) // per_page))
+        links = []
+        def link(number,rel):
+            query = {key: values for key, values in self.params.items() if key not in ('page','per_page')}
+            query.update({'page': [str(number)],'per_page': [str(per_page)]})
+            url = f"http://{self.headers.get('Host')}{urlsplit(self.path).path}?{urlencode(query,doseq = True)}"
+            links.append(f'<{url}>; rel="{rel}"')
+        link(1,"first")
+        if page < last:
+            link(page + 1,"next")
+        if page > 1:
+            link(page - 1,"prev")
+        link(last,"last")
+        self.send(200,items[(page - 1) * per_page:page * per_page],{'Link': ",".join(links)})
+
+    def current_user(self):
+        self.send(200,{'id': 999999,'name': "Mock Teacher"})
+
+    def get_course(self,course_id):
+        course = self.server.data.courses.get(course_id)
+        if course is None:
+            return self.send(404,{'errors': [{'message': "The specified resource does not exist."}]})
+        self.send(200,course)
+
+    def get_users(self,course_id):
+        data = self.server.data
+        self.send_page([data.users[user_id] for user_id in data.rosters.get(course_id,[])])
+
+    def get_assignments(self,course_id):
+        with self.server.data.lock:
+            self.send_page(list(self.server.data.assignments.get(course_id,{}).values()))
+
+    def get_assignment(self,course_id,assignment_id):
+        assignment = self.server.data.assignments.get(course_id,{}).get(assignment_id)
+        if assignment is None:
+            return self.send(404,{'errors': [{'message': "The specified resource does not exist."}]})
+        self.send(200,assignment)
+
+    def create_assignment(self,course_id):
+        params = {}
+        for key, values in self.params.items():
+            field = re.fullmatch(r"assignment\[(\w+)\](\[\])?",key)
+            if field:
+                params[field.group(1)] = values if field.group(2) else values[0]
+        self.send(200,self.server.data.add_assignment(course_id,params))
+
+    def graphql(self,request):
+        # answers canvas_graphql.py's Transfer query: each aliased course(id:) or assignment(id:) with its
+        # id and cursor in the variables
+        data = self.server.data
+        config = self.server.config
+        variables = request.get('variables') or {}
+        fields = re.findall(r"(\w+): (course|assignment)\(id: \$(\w+)\) \{\s*(\w+)\(first: \$first, after: \$(\w+)",
+                            request.get('query',""))
+        if not config.graphql or not fields:
+            return self.send(200,{'errors': [{'message': "Field 'usersConnection' doesn't exist on type 'Course'"}]})
+        base = f"http://{self.headers.get('Host')}"
+        answer = {}
+        for alias, kind, id_name, connection, after_name in fields:
+            if kind == "course":
+                nodes = [{'_id': str(user['id']),'name': user['name'],'sortableName': user['sortable_name'],
+                          'shortName': user['short_name'],'sisId': user['sis_user_id'],'loginId': user['login_id']}
+                         for user in (data.users[user_id] for user_id in data.rosters.get(int(variables[id_name]),[]))]
+            else:
+                assignment_id = int(variables[id_name])
+                with data.lock:
+                    found = [s for (a, u), s in data.submissions.items() if a == assignment_id]
+                nodes = [{'_id': str(s['id']),'user': {'_id': str(s['user_id'])},
+                          'attachments': [{'_id': str(f['id']),'displayName': f['display_name'],'contentType': f['content-type'],
+                                           'size': f['size'] or config.file_size,'url': f"{base}/files/{f['id']}/download"}
+                                          for f in s['attachments']]}
+                         for s in found]
+            start = int(variables.get(after_name) or 0)
+            end = start + min(int(variables.get('first') or 10),config.max_page_size)
+            answer[alias] = {connection: {'nodes': nodes[start:end],'pageInfo': {'hasNextPage': end < len(nodes),'endCursor': str(end)}}}
+        self.send(200,{'data': answer})
+
+    def get_submissions(self,course_id):
+        data = self.server.data
+        assignment_ids = [int(i) for i in self.params.get('assignment_ids[]',[])]
+        student_ids = self.params.get('student_ids[]',[])
+        users = data.rosters.get(course_id,[]) if student_ids in ([],["all"]) else [int(i) for i in student_ids]
+        found = [data.submissions[(a,u)] for a in assignment_ids for u in users if (a,u) in data.submissions]
+        base = f"http://{self.headers.get('Host')}"
+        self.send_page([{**s,'attachments': [{**f,'size': f['size'] or self.server.config.file_size,
+                                              'url': f"{base}/files/{f['id']}/download"} for f in s['attachments']]}
+                        for s in found])
+
+    def submit(self,course_id,assignment_id):
+        data = self.server.data
+        user_id = int(self.param('submission[user_id]',0))
+        files = [data.files[int(i)] for i in self.params.get('submission[file_ids][]',[]) if int(i) in data.files]
+        submission = data.submission(assignment_id,user_id,files)
+        with data.lock:
+            data.submissions[(assignment_id,user_id)] = submission
+        self.send(201,submission)
+
+    def start_upload(self,course_id,assignment_id,user_id):
+        data = self.server.data
+        with data.lock:
+            upload_id = len(data.uploads) + 1
+            data.uploads[upload_id] = (user_id,self.param('name'),int(self.param('size',0)))
+        self.send(200,{'upload_url': f"http://{self.headers.get('Host')}/upload/{upload_id}",
+                       'upload_params': {'filename': self.param('name'),'content_type': self.param('content_type')}})
+
+    def finish_upload(self,path,body):
+        user_id, name, size = self.server.data.uploads[int(path.split("/")[2])]
+        new_file = self.server.data.add_file(user_id,size,name)
+        self.send(201,{**new_file,'size': size})
+
+    def download(self,path):
+        self.rate_headers = {}
+        body = b"%PDF" + b"\0" * (self.server.config.file_size - 4)
+        self.send_response(200)
+        self.send_header("Content-Type","application/pdf")
+        self.send_header("Content-Length",str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class Mock_Canvas:
+    # runs a Mock_Server on its own thread, use as a context manager or call start() and stop()
+    def __init__(self,data,config = None,port = 0):
+        self.server = Mock_Server(("127.0.0.1",port),data,config or Mock_Config())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target = self.server.serve_forever,daemon = True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self,*exc):
+        self.stop()
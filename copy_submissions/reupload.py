@@ -0,0 +1,160 @@
+# ______ATTACHMENT RE-UPLOAD______
+#
+# Moves a submission's file into the destination course as a new upload instead of resubmitting the
+# source file's id, which Canvas doesn't always accept across courses. Each attachment is downloaded and
+# sent on to Canvas's submission file upload in the same pass: bytes are handed to the upload as they
+# arrive, so nothing is held in memory or written to a temporary file, however large the file is.
+#
+# Canvas's upload is three steps:
+#   1. POST courses/:id/assignments/:id/submissions/:user_id/files with the file's name and size,
+#      which returns an upload_url and the upload_params to post along with the file,
+#   2. a multipart POST of those params and the file to upload_url (Canvas's file store, not the API),
+#   3. a GET of the url that answer points at, which confirms the upload and returns the new file.
+# The file's size is checked against the source and, where the file store sends back an MD5 ETag,
+# its checksum too, before the new file id is handed back to be submitted.
+#
+# With a Blob_Store the download is also saved as it streams past, and a file that is already in the
+# store is uploaded from disk without downloading it again. Canvas keeps submission files per student,
+# so a file can't be shared between students, but each student's copy is only uploaded once per
+# destination assignment however many times it is asked for.
+
+from contextlib import contextmanager
+import hashlib
+import re
+import uuid
+
+CHUNK_SIZE = 256 * 1024
+TIMEOUT = (10,300)  # seconds to connect, and to wait for the next bytes of a download or upload
+MD5_ETAG = re.compile(r'^"?([0-9a-f]{32})"?$')
+
+class Upload_Error(Exception):
+    pass
+
+class Multipart_Stream:
+    # multipart/form-data body that reads the file from source (an iterator of bytes) while requests
+    # sends it. The length is worked out up front so the upload goes out with a Content-Length, which
+    # the file store needs for form posts, rather than chunked transfer encoding.
+    def __init__(self,params,filename,content_type,source,size):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        head = b""
+        for name, value in params.items():
+            head += (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n').encode()
+        filename = filename.replace('"','%22').replace("\r","").replace("\n","")
+        head += (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                 f'Content-Type: {content_type}\r\n\r\n').encode()
+        self.buffer = head
+        self.tail = f"\r\n--{boundary}--\r\n".encode()
+        self.length = len(head) + size + len(self.tail)
+        self.source = iter(source)
+        self.size = size
+        self.sent = 0  # file bytes read from source so far
+        self.md5 = hashlib.md5()
+        self.finished = False
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    def read(self,size = -1):
+        while not self.finished and (size < 0 or len(self.buffer) < size):
+            self.fill()
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+    def fill(self):
+        chunk = next(self.source,None)
+        if chunk is None:
+            if self.sent != self.size:
+                raise Upload_Error(f"Download ended after {self.sent} of {self.size} bytes")
+            self.buffer += self.tail
+            self.finished = True
+            return
+        self.sent += len(chunk)
+        if self.sent > self.size:
+            raise Upload_Error(f"Download is bigger than the {self.size} bytes Canvas reported")
+        self.md5.update(chunk)
+        self.buffer += chunk
+
+class Attachment_Uploader:
+    def __init__(self,canvas,store = None):
+        self.requester = canvas._Canvas__requester
+        self.session = self.requester._session
+        self.store = store  # a Blob_Store, or None to always download
+        self.uploaded = {}  # (destination assignment id, user id, sha256) -> id of the file already uploaded
+
+    def reupload(self,new_assignment,user_id,attachment):
+        # copies one source attachment into user_id's submission files for new_assignment and returns the
+        # new file's id, ready to submit
+        size = attachment.size
+        sha = self.store.find(attachment.id,size) if self.store is not None else None
+        if (new_assignment.id,user_id,sha) in self.uploaded:
+            return self.uploaded[(new_assignment.id,user_id,sha)]
+        content_type = getattr(attachment,'content-type',None) or "application/octet-stream"
+        name = getattr(attachment,'display_name',None) or attachment.filename
+        ticket = self.requester.request(
+            "POST",f"courses/{new_assignment.course_id}/assignments/{new_assignment.id}/submissions/{user_id}/files",
+            _kwargs = [("name",name),("size",size),("content_type",content_type),("on_duplicate","rename")]).json()
+
+        with self.open_source(attachment,sha,name) as source:
+            body = Multipart_Stream({key: str(value) for key, value in ticket['upload_params'].items()},name,
+                                    content_type,source,size)
+            upload = self.session.post(ticket['upload_url'],data = body,headers = {"Content-Type": body.content_type},
+                                       allow_redirects = False,timeout = TIMEOUT)
+
+        if upload.status_code >= 400:
+            raise Upload_Error(f"Upload of {name} was refused ({upload.status_code})")
+        etag = MD5_ETAG.match(upload.headers.get("ETag",""))
+        if etag is not None and etag.group(1) != body.md5.hexdigest():
+            raise Upload_Error(f"Checksum of uploaded {name} doesn't match the source file")
+        new_file = self.confirm(upload)
+        if new_file.get('size') is not None and new_file['size'] != size:
+            raise Upload_Error(f"Uploaded {name} is {new_file['size']} bytes, the source file is {size}")
+        if self.store is not None:
+            sha = sha or self.store.find(attachment.id,size)
+            if sha is not None:
+                self.uploaded[(new_assignment.id,user_id,sha)] = new_file['id']
+        return new_file['id']
+
+    @contextmanager
+    def open_source(self,attachment,sha,name):
+        # the attachment's bytes as an iterator of chunks, from the store when it has them
+        if sha is not None:
+            with self.store.open(sha) as file:
+                yield iter(lambda: file.read(CHUNK_SIZE),b"")
+            return
+        with self.session.get(attachment.url,stream = True,timeout = TIMEOUT,
+                              headers = {"Authorization": f"Bearer {self.requester.access_token}"}) as download:
+            if download.status_code != 200:
+                raise Upload_Error(f"Couldn't download {name} ({download.status_code})")
+            chunks = download.iter_content(CHUNK_SIZE)
+            if self.store is None:
+                yield chunks
+                return
+            chunks = self.store.tee(chunks,attachment.id,attachment.size)
+            try:
+                yield chunks
+            finally:
+                chunks.close()  # an upload that stopped part way doesn't leave a partial file behind
+
+    def confirm(self,upload):
+        # the file store either redirects to Canvas's confirm url or answers with json that has the file,
+        # or the url to get it from
+        if 300 <= upload.status_code < 400:
+            location = upload.headers.get("Location")
+        else:
+            new_file = upload.json()
+            if 'id' in new_file:
+                return new_file
+            location = new_file.get('location')
+        if not location:
+            raise Upload_Error("Canvas didn't confirm the upload")
+        return self.requester.request("GET",_url = location).json()
@@ -0,0 +1,82 @@
+# ______ROSTER MATCHING______
+#
+# Finds the students enrolled in both the source course and a destination course (or any of several
+# destination courses). Every roster is paged through at the same time on its own thread and joined on
+# Canvas user id as the pages come in, so a student shows up as soon as both of their enrollments have
+# been seen rather than after all the rosters have loaded.
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import tracing
+
+FLUSH_SECONDS = 0.1  # how often matches found so far are handed to on_match
+
+class Roster_Join:
+    def __init__(self,on_match = None):
+        self.lock = threading.Lock()
+        self.on_match = on_match
+        self.source = {}  # id -> (position in source roster, student) not yet matched
+        self.destination_ids = set()
+        self.matched = []  # (position, student)
+        self.pending = []  # matched but not yet given to on_match
+        self.last_flush = time.monotonic()
+
+    def add_source(self,position,student):
+        with self.lock:
+            if student.id in self.destination_ids:
+                self.match(position,student)
+            else:
+                self.source[student.id] = (position,student)
+
+    def add_destination(self,student):
+        with self.lock:
+            self.destination_ids.add(student.id)
+            found = self.source.pop(student.id,None)
+            if found is not None:
+                self.match(*found)
+
+    def match(self,position,student):
+        self.matched.append((position,student))
+        self.pending.append(student)
+
+    def flush(self,force = False):
+        with self.lock:
+            if not self.pending or (not force and time.monotonic() - self.last_flush < FLUSH_SECONDS):
+                return
+            batch, self.pending = self.pending, []
+            self.last_flush = time.monotonic()
+        if self.on_match is not None:
+            self.on_match(batch)
+
+    def result(self):
+        # matched students in the source course's order
+        return [student for position, student in sorted(self.matched,key = lambda match: match[0])]
+
+def stream_matched_students(source_students,destination_rosters,on_match = None,cancel = None):
+    # the source roster and each of the destination rosters are iterables that fetch lazily
+    # (e.g. Canvas_Lookup.iter_students) so each is paged through on its own thread.
+    # on_match(list_of_students) is called from those threads with each new batch of matches
+    join = Roster_Join(on_match)
+
+    def read_source():
+        for position, student in enumerate(source_students):
+            if cancel is not None and cancel.is_set():
+                return
+            join.add_source(position,student)
+            join.flush()
+
+    def read_destination(destination_students):
+        for student in destination_students:
+            if cancel is not None and cancel.is_set():
+                return
+            join.add_destination(student)
+            join.flush()
+
+    with ThreadPoolExecutor(max_workers = 1 + len(destination_rosters)) as pool:
+        futures = [pool.submit(tracing.inherit(read_source))] + [pool.submit(tracing.inherit(read_destination),roster)
+                                                                  for roster in destination_rosters]
+        for future in futures:
+            future.result()
+    join.flush(force = True)
+    return join.result()
@@ -0,0 +1,63 @@
+# ______ROSTER SEARCH______
+#
+# In memory index over the student list so the search box can filter on every keystroke. Names, student
+# numbers and Canvas ids are normalized (lower case, accents removed) and broken into every 1 to 3
+# character piece, so any search is a couple of set lookups instead of a scan of every student.
+
+import unicodedata
+
+GRAM = 3
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD',str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.casefold().split())
+
+def grams(text):
+    found = set()
+    for size in range(1,GRAM + 1):
+        for i in range(len(text) - size + 1):
+            found.add(text[i:i + size])
+    return found
+
+class Roster_Index:
+    def __init__(self):
+        self.texts = {}  # row id -> normalized fields joined with "|" so a match can't span two fields
+        self.postings = {}  # gram -> set of row ids containing it
+
+    def add(self,row_id,*fields):
+        fields = [normalize(field) for field in fields if field is not None]
+        self.texts[row_id] = "|".join(fields)
+        for field in fields:
+            for gram in grams(field):
+                self.postings.setdefault(gram,set()).add(row_id)
+
+    def clear(self):
+        self.__init__()
+
+    def substring(self,word):
+        # row ids with word anywhere in any field, which covers prefixes of names and numbers too
+        word = normalize(word)
+        if len(word) <= GRAM:
+            return set(self.postings.get(word,()))
+        pieces = [word[i:i + GRAM] for i in range(len(word) - GRAM + 1)]
+        pieces.sort(key = lambda piece: len(self.postings.get(piece,())))
+        candidates = set(self.postings.get(pieces[0],()))
+        for piece in pieces[1:]:
+            if not candidates:
+                break
+            candidates &= self.postings.get(piece,set())
+        return {row_id for row_id in candidates if word in self.texts[row_id]}
+
+    def search(self,query):
+        # every word in the query has to appear somewhere, None means no filter
+        words = normalize(query).split()
+        if not words:
+            return None
+        found = None
+        for word in sorted(words,key = len,reverse = True):
+            matches = self.substring(word)
+            found = matches if found is None else found & matches
+            if not found:
+                break
+        return found
@@ -0,0 +1,64 @@
+# ______SETTINGS______
+#
+# Where the app keeps its files, which Canvas it talks to and how links are read. Kept apart from
+# transfer.py and free of canvasapi so main.py can import it, and show its window, before the slower
+# Canvas modules have loaded. transfer.py re-exports all of it.
+
+from pathlib import Path
+import re
+
+DEFAULT_TOKEN = 'mytoken.txt'  # Text file with your api token saved in the same directory as this script
+CANVAS_URL = "https://canvas.ubc.ca"
+APP_DIR = Path.home() / ".ubc_copy_submissions"  # local files the app keeps between runs
+JOURNAL_DIR = APP_DIR / "journals"
+CACHE_PATH = APP_DIR / "metadata.sqlite3"
+BLOB_DIR = APP_DIR / "files"  # copies of downloaded submission files, see blob_store.py
+USER_PATH = APP_DIR / "last_user.txt"  # name shown in the header while the token is being checked
+
+def get_course_code(link,type):
+    course_pattern = r"(?<=courses/)(\d+)"
+    course_code = re.findall(course_pattern,link)
+    if type == "course" and course_code:
+        return (True,int(course_code[0]))
+    elif type == "assignment" and course_code:
+        assignment_pattern = r"(?<=assignments/)(\d+)"
+        assignment_code = re.findall(assignment_pattern,link)
+        if assignment_code:
+            return (True,int(course_code[0]),int(assignment_code[0]))
+    return (False, None)
+
+def get_assignment_codes(text):
+    # every assignment link in text, which can hold several links separated by spaces, commas or new lines
+    codes = []
+    for link in re.split(r"[\s,;]+",text):
+        code = get_course_code(link,'assignment')
+        if code[0]:
+            codes.append(code[1:])
+    return codes
+
+def get_course_codes(text):
+    # every course link in text, in the same format as get_assignment_codes
+    codes = []
+    for link in re.split(r"[\s,;]+",text):
+        code = get_course_code(link,'course')
+        if code[0] and code[1] not in codes:
+            codes.append(code[1])
+    return codes
+
+def student_number(student):
+    if getattr(student,'sis_user_id',None) is not None:
+        return student.sis_user_id
+    return student.id
+
+def last_user_name():
+    try:
+        return USER_PATH.read_text().strip()
+    except OSError:
+        return ""
+
+def remember_user_name(name):
+    try:
+        USER_PATH.parent.mkdir(parents = True,exist_ok = True)
+        USER_PATH.write_text(name)
+    except OSError:
+        pass  # only a convenience for the next start
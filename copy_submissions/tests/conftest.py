@@ -0,0 +1,42 @@
+import sys
+import warnings
+from pathlib import Path
+import pytest
+
+sys.path.insert(0,str(Path(__file__).resolve().parent.parent))  # the app's modules import each other by name
+
+from canvasapi import Canvas
+from canvas_http import install_session
+from lookup import Canvas_Lookup
+from mock_canvas import Mock_Canvas, Mock_Config, Mock_Data
+from transfer import Transfer_Engine
+
+@pytest.fixture
+def data():
+    # 20 students in the source course, 18 of them and 2 others in the destination
+    return Mock_Data(20)
+
+@pytest.fixture
+def server(data):
+    with Mock_Canvas(data,Mock_Config(latency = 0,jitter = 0)) as server:
+        yield server
+
+@pytest.fixture
+def canvas(server):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # the mock server is plain http
+        canvas = Canvas(server.url,"token")
+    install_session(canvas)
+    return canvas
+
+@pytest.fixture
+def make_engine(canvas,tmp_path):
+    # a new engine each call is a new session of the app, sharing the journal folder with the others
+    def make():
+        return Transfer_Engine(canvas,warn = lambda text: None,journal_dir = tmp_path / "journals",
+                               lookup = Canvas_Lookup(canvas),blob_dir = None)
+    return make
+
+@pytest.fixture
+def engine(make_engine):
+    return make_engine()
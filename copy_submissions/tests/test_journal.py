@@ -0,0 +1,65 @@
+from journal import Transfer_Journal, journal_key
+from mock_canvas import DESTINATION_COURSE, SOURCE_ASSIGNMENT, SOURCE_COURSE
+from transfer import Transfer_Job
+
+def job(**kwargs):
+    return Transfer_Job(SOURCE_COURSE,SOURCE_ASSIGNMENT,DESTINATION_COURSE,**kwargs)
+
+def interrupt(engine,job):
+    # creates the job's assignment and journal but submits nothing, like a run stopped after prepare
+    return engine.prepare(job).new_assignment
+
+def test_journal_survives_a_torn_line(tmp_path):
+    journal = Transfer_Journal(tmp_path / "journal.jsonl")
+    journal.set_assignment(7)
+    journal.mark_done(1,10)
+    with open(journal.path,'a') as file:
+        file.write('{"user_id": 2, "attach')
+    reloaded = Transfer_Journal(journal.path)
+    assert reloaded.assignment_id == 7
+    assert reloaded.is_done(1,10)
+    assert not reloaded.is_done(2,10)
+
+def test_key_includes_name_and_students():
+    assert journal_key(job()) == journal_key(job())
+    assert journal_key(job(students = [2,1])) == journal_key(job(students = [1,2]))
+    assert journal_key(job()) != journal_key(job(assignment_name = "Copy"))
+    assert journal_key(job()) != journal_key(job(students = [1,2]))
+    assert journal_key(job(students = [1])) != journal_key(job(students = [1,2]))
+
+def test_interrupted_transfer_resumes(server,make_engine):
+    assignment = interrupt(make_engine(),job())
+    created = len(server.server.data.assignments[DESTINATION_COURSE])
+
+    result = make_engine().run(job())
+    assert result.resumed
+    assert result.assignment.id == assignment.id
+    assert result.submitted == 18
+    assert len(server.server.data.assignments[DESTINATION_COURSE]) == created
+
+    again = make_engine().run(job())  # the finished transfer's journal is gone, so this is a new copy
+    assert not again.resumed
+    assert again.assignment.id != assignment.id
+
+def test_other_name_or_students_doesnt_resume(server,make_engine):
+    assignment = interrupt(make_engine(),job())
+    roster = server.server.data.rosters[SOURCE_COURSE]
+
+    renamed = make_engine().run(job(assignment_name = "Copy"))
+    assert not renamed.resumed
+    assert renamed.assignment.name == "Copy"
+
+    some = make_engine().run(job(students = roster[:2]))
+    assert not some.resumed
+    assert some.assignment.id not in (assignment.id,renamed.assignment.id)
+    assert len(some.students) == 2
+
+    resumed = make_engine().run(job())
+    assert resumed.resumed
+    assert resumed.assignment.id == assignment.id
+
+def test_repeated_job_in_a_batch_gets_its_own_journal(engine):
+    results, failures = engine.run_many([job(),job()])
+    assert not failures
+    assert [result.resumed for result in results] == [False,False]
+    assert results[0].assignment.id != results[1].assignment.id
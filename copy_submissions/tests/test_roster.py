@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+from mock_canvas import DESTINATION_COURSE, SOURCE_COURSE
+from roster import Roster_Join, stream_matched_students
+
+def student(user_id):
+    return SimpleNamespace(id = user_id)
+
+def matched(engine):
+    source_course = engine.lookup.get_course(SOURCE_COURSE)
+    return [student.id for student in engine.get_matched_students(source_course,[engine.lookup.get_course(DESTINATION_COURSE)])]
+
+def test_join_in_source_order_whichever_side_comes_first():
+    join = Roster_Join()
+    join.add_destination(student(3))
+    for position, user_id in enumerate([5,3,4,1]):
+        join.add_source(position,student(user_id))
+    join.add_destination(student(1))
+    join.add_destination(student(9))
+    join.add_destination(student(1))
+    assert [s.id for s in join.result()] == [3,1]
+
+def test_students_in_several_destinations_match_once():
+    students = [student(user_id) for user_id in range(1,7)]
+    batches = []
+    found = stream_matched_students(students,[students[:3],students[2:5],students[4:]],on_match = batches.append)
+    assert [s.id for s in found] == [1,2,3,4,5,6]
+    assert sorted(s.id for batch in batches for s in batch) == [1,2,3,4,5,6]
+
+def test_roster_join_against_canvas(data,engine):
+    shared = data.rosters[SOURCE_COURSE][:18]
+    assert matched(engine) == shared
+
+def test_duplicate_student_numbers(data,engine):
+    # two students with the same number are still two students, the join is on Canvas id
+    data.users[3]['sis_user_id'] = data.users[4]['sis_user_id']
+    data.users[19]['sis_user_id'] = data.users[4]['sis_user_id']  # not in the destination course
+    assert matched(engine) == data.rosters[SOURCE_COURSE][:18]
+    assert engine.resolve_students(SOURCE_COURSE,DESTINATION_COURSE,[data.users[4]['sis_user_id']]) == [3,4]
+
+def test_missing_student_numbers(data,engine):
+    data.users[5]['sis_user_id'] = None
+    data.users[6]['sis_user_id'] = None
+    assert matched(engine) == data.rosters[SOURCE_COURSE][:18]
+    assert engine.resolve_students(SOURCE_COURSE,DESTINATION_COURSE,["5"," 6 ",data.users[7]['sis_user_id'],"",
+                                                                      "99999999"]) == [5,6,7]
@@ -0,0 +1,48 @@
+from mock_canvas import Mock_Data
+from search_index import Roster_Index, normalize
+
+def build(users):
+    # rows the way Student_Table adds them: name, student number, Canvas id
+    index = Roster_Index()
+    for user in users:
+        index.add(user['id'],user['name'],user['sis_user_id'],user['id'])
+    return index
+
+def scan(users,query):
+    # the same search done the slow way
+    words = normalize(query).split()
+    return {user['id'] for user in users
+            if all(any(word in normalize(field) for field in (user['name'],user['sis_user_id'],user['id'])) for word in words)}
+
+def test_matches_a_full_scan():
+    users = list(Mock_Data(150).users.values())
+    index = build(users)
+    for query in ["1","12","student","STUDENT 12","stu 12","udent 3","1000001","10000149","student 149","14 student",
+                  "ent 1 2","nobody","student 1000"]:
+        assert index.search(query) == scan(users,query),query
+
+def test_names_numbers_and_ids():
+    users = [{'id': 41,'name': "Zoë Ångström",'sis_user_id': "12345678"},
+             {'id': 42,'name': "Zoe Smith",'sis_user_id': "87650000"},
+             {'id': 43,'name': "Ann Lee",'sis_user_id': None}]
+    index = build(users)
+    assert index.search("zoe") == {41,42}
+    assert index.search("ÅNGSTRÖM") == {41}
+    assert index.search("zoe  smith") == {42}
+    assert index.search("4567") == {41}
+    assert index.search("43") == {43}
+    assert index.search("lee 4") == {43}
+    assert index.search("smith ann") == set()
+    assert index.search("   ") is None
+
+def test_a_match_cant_span_two_fields():
+    index = Roster_Index()
+    index.add(1,"Ann","12")
+    assert index.search("ann") == {1}
+    assert index.search("ann12") == set()
+    assert index.search("nn1") == set()
+
+def test_clear():
+    index = build(Mock_Data(5).users.values())
+    index.clear()
+    assert index.search("student") == set()
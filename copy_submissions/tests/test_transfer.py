@@ -0,0 +1,87 @@
+import threading
+from canvasapi import exceptions as c_exceptions
+import pytest
+import requests
+from mock_canvas import DESTINATION_COURSE, SOURCE_ASSIGNMENT, SOURCE_COURSE
+from transfer import Assignment_Name_Index, Transfer_Cancelled, Transfer_Error, Transfer_Job
+
+def job(**kwargs):
+    return Transfer_Job(SOURCE_COURSE,SOURCE_ASSIGNMENT,DESTINATION_COURSE,**kwargs)
+
+# ______ASSIGNMENT NAMES______
+
+def test_next_free_name():
+    index = Assignment_Name_Index(["Quiz","Quiz (1)","Quiz (3)"])
+    assert index.next_free("Quiz",reserve = False) == "Quiz (2)"
+    assert index.next_free("Quiz") == "Quiz (2)"
+    assert index.next_free("Quiz") == "Quiz (4)"
+    assert index.next_free("Lab") == "Lab"
+    assert index.next_free("Lab") == "Lab (1)"
+
+def test_names_against_the_destination_course(engine):
+    # the mock destination already has "Assignment 1" and "Assignment 1 (1)" to "Assignment 1 (19)"
+    destination_course = engine.lookup.get_course(DESTINATION_COURSE)
+    assert engine.get_assignment_name("Assignment 1",destination_course) == "Assignment 1 (20)"
+    assert engine.get_assignment_name("Assignment 1",destination_course) == "Assignment 1 (21)"
+    assert engine.get_assignment_name("Assignment 1 (5)",destination_course) == "Assignment 1 (5) (1)"
+    assert engine.get_assignment_name("New",destination_course) == "New"
+
+def test_copies_in_one_run_get_different_names(server,engine):
+    results, failures = engine.run_many([job(),job(),job(assignment_name = "Assignment 1 (3)")])
+    assert not failures
+    assert [result.assignment.name for result in results] == ["Assignment 1 (20)","Assignment 1 (21)","Assignment 1 (3) (1)"]
+    names = [assignment['name'] for assignment in server.server.data.assignments[DESTINATION_COURSE].values()]
+    assert len(names) == len(set(names))
+
+def test_plan_doesnt_reserve_names(engine):
+    assert engine.plan(job()).assignment_name == "Assignment 1 (20)"
+    assert engine.plan(job()).assignment_name == "Assignment 1 (20)"
+    result = engine.run(job())
+    assert result.assignment.name == "Assignment 1 (20)"
+
+# ______FAILURES______
+
+def drop_connection(engine,bad_job):
+    # bad_job's reads fail the way a dropped connection does
+    resolve = engine.resolve
+    def flaky(job):
+        if job is bad_job:
+            raise requests.ConnectionError("Connection aborted")
+        return resolve(job)
+    engine.resolve = flaky
+
+def test_a_failed_job_doesnt_stop_the_others(engine):
+    jobs = [job(assignment_name = "First"),
+            Transfer_Job(SOURCE_COURSE,999,DESTINATION_COURSE),  # no such assignment
+            job(assignment_name = ""),
+            job(assignment_name = "Dropped"),
+            job(assignment_name = "Last")]
+    drop_connection(engine,jobs[3])
+    results, failures = engine.run_many(jobs)
+    assert [result.job for result in results] == [jobs[0],jobs[4]]
+    assert all(result.submitted == 18 and not result.errors for result in results)
+    assert [failed for failed, error in failures] == [jobs[1],jobs[2],jobs[3]]
+    assert isinstance(failures[0][1],c_exceptions.ResourceDoesNotExist)
+    assert isinstance(failures[1][1],Transfer_Error)
+    assert isinstance(failures[2][1],requests.ConnectionError)
+
+def test_failures_in_one_destination_dont_stop_another(engine):
+    jobs = [Transfer_Job(SOURCE_COURSE,SOURCE_ASSIGNMENT,SOURCE_COURSE),  # same course, its own pipeline
+            job(assignment_name = "Copy")]
+    results, failures = engine.run_many(jobs)
+    assert [result.job for result in results] == [jobs[1]]
+    assert [failed for failed, error in failures] == [jobs[0]]
+    assert isinstance(failures[0][1],Transfer_Error)
+
+def test_stop_on_error(server,engine):
+    jobs = [job(assignment_name = ""),job(assignment_name = "Never")]
+    results, failures = engine.run_many(jobs,stop_on_error = True)
+    assert results == []
+    assert [failed for failed, error in failures] == [jobs[0]]
+    assert "Never" not in [assignment['name'] for assignment in server.server.data.assignments[DESTINATION_COURSE].values()]
+
+def test_cancel_ends_the_batch(engine):
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(Transfer_Cancelled):
+        engine.run_many([job(),job()],cancel = cancel)
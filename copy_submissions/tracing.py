@@ -0,0 +1,202 @@
+# ______TRACING______
+#
+# Opt-in record of where a run's time goes. When it is on, every request made through the shared Canvas
+# session (canvas_http.SESSION) or the async client (async_canvas.Async_Canvas) is logged with its
+# endpoint, status, latency, time spent held back by the rate governor, page number, size and retries,
+# along with the phases the app and Transfer_Engine mark with tracing.phase(...), e.g. "match rosters",
+# "fetch submissions", "replay" and the Tk callbacks that update the window. Coroutines count towards the
+# phase that was open on the thread that handed them to the event loop. finish() writes
+#   trace.jsonl         one line per call and per phase
+#   trace.chrome.json   the same as a Chrome trace, open it in chrome://tracing or ui.perfetto.dev
+# to the trace directory and returns a summary: slowest endpoints, calls per phase, and time spent
+# waiting on Canvas compared with CPU time.
+#
+# Turn it on with --trace DIR in cli.py, or for the app by setting COPY_SUBMISSIONS_TRACE=DIR.
+# When it is off, phase() does nothing and the session skips recording.
+
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+import json
+import os
+from pathlib import Path
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+TRACE_ENV = "COPY_SUBMISSIONS_TRACE"
+SLOWEST = 8  # endpoints listed in the summary
+
+TRACER = None
+OWNER = ContextVar("tracing_phase",default = None)  # the open phase, carried into coroutines
+
+def start(directory):
+    from canvas_http import SESSION  # imported here so importing tracing doesn't pull in requests
+    global TRACER
+    TRACER = Tracer(directory)
+    SESSION.tracer = TRACER
+    return TRACER
+
+def start_from_env():
+    directory = os.environ.get(TRACE_ENV)
+    return start(directory) if directory else None
+
+def finish():
+    # writes the trace files and returns the summary, or None if tracing is off
+    global TRACER
+    tracer, TRACER = TRACER, None
+    if tracer is None:
+        return None
+    from canvas_http import SESSION
+    SESSION.tracer = None
+    tracer.export()
+    return tracer.summary()
+
+def phase(name):
+    return TRACER.phase(name) if TRACER is not None else nullcontext()
+
+def inherit(fn):
+    # fn, set to count its calls towards the phase that is open on this thread, for handing to a pool
+    return TRACER.inherit(fn) if TRACER is not None else fn
+
+def endpoint(url):
+    # the url's path with ids and tokens swapped for :id, so calls to the same endpoint group together
+    parts = urlsplit(url)
+    path = re.sub(r"/(\d+|[^/]{24,})(?=/|$)","/:id",parts.path)
+    if path.startswith("/api/v1/"):
+        return path[len("/api/v1/"):]
+    return parts.netloc + path
+
+class Tracer:
+    def __init__(self,directory):
+        self.directory = Path(directory)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.calls = []
+        self.phases = []
+        self.start = time.perf_counter()
+        self.cpu_start = time.process_time()
+
+    @contextmanager
+    def phase(self,name):
+        # calls made on this thread inside the phase, or by functions passed through inherit() while it
+        # is open, are counted towards it
+        entry = {'type': "phase",'name': name,'thread': threading.get_ident(),'start': time.perf_counter() - self.start,'calls': 0}
+        stack = self.local.__dict__.setdefault('stack',[])
+        stack.append(entry)
+        token = OWNER.set(entry)
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            entry['duration'] = time.perf_counter() - self.start - entry['start']
+            entry['cpu'] = time.thread_time() - cpu
+            OWNER.reset(token)
+            stack.pop()
+            with self.lock:
+                self.phases.append(entry)
+
+    def inherit(self,fn):
+        stack = getattr(self.local,'stack',None)
+        if not stack:
+            return fn
+        owner = stack[-1]
+        def run(*args,**kwargs):
+            worker = self.local.__dict__.setdefault('stack',[])
+            worker.append(owner)
+            token = OWNER.set(owner)
+            try:
+                return fn(*args,**kwargs)
+            finally:
+                OWNER.reset(token)
+                worker.pop()
+        return run
+
+    def record_call(self,method,url,response,started,queued,retries,stream):
+        size = response.headers.get("Content-Length")
+        if size is None and not stream:
+            size = len(response.content)
+        self.record(method,url,response.status_code,started,queued,retries,size)
+
+    def record(self,method,url,status,started,queued,retries,size):
+        # size in bytes, None if unknown
+        stack = getattr(self.local,'stack',None)
+        call = {
+            'type': "call",
+            'method': method.upper(),
+            'endpoint': endpoint(url),
+            'status': status,
+            'thread': threading.get_ident(),
+            'start': started - self.start,
+            'latency': time.perf_counter() - started,
+            'queued': queued,  # seconds held back by the rate governor, included in latency
+            'page': parse_qs(urlsplit(url).query).get('page',["1"])[0],
+            'bytes': int(size) if size is not None else None,
+            'retries': retries,
+        }
+        with self.lock:
+            owner = stack[-1] if stack else OWNER.get()  # the event loop's thread has no phases of its own
+            call['phase'] = owner['name'] if owner is not None else None
+            if owner is not None:
+                owner['calls'] += 1
+            self.calls.append(call)
+
+    def export(self):
+        self.directory.mkdir(parents = True,exist_ok = True)
+        with self.lock:
+            records = sorted(self.calls + self.phases,key = lambda record: record['start'])
+        with open(self.directory / "trace.jsonl",'w') as file:
+            for record in records:
+                file.write(json.dumps(record) + "\n")
+
+        threads = {}
+        events = []
+        for record in records:
+            tid = threads.setdefault(record['thread'],len(threads) + 1)
+            if record['type'] == "call":
+                name = f"{record['method']} {record['endpoint']}"
+                duration = record['latency']
+            else:
+                name = record['name']
+                duration = record.get('duration',0)
+            events.append({'name': name,'cat': record['type'],'ph': "X",'pid': 1,'tid': tid,
+                           'ts': record['start'] * 1e6,'dur': duration * 1e6,
+                           'args': {key: value for key, value in record.items() if key not in ('type','thread','start')}})
+        with open(self.directory / "trace.chrome.json",'w') as file:
+            json.dump({'traceEvents': events,'displayTimeUnit': "ms"},file)
+
+    def summary(self):
+        with self.lock:
+            calls = list(self.calls)
+            phases = list(self.phases)
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu_start
+        waiting = sum(call['latency'] for call in calls)
+        queued = sum(call['queued'] for call in calls)
+        lines = [f"Trace: {len(calls)} calls in {wall:.1f}s, {cpu:.1f}s CPU",
+                 f"  waiting on Canvas {waiting:.1f}s across all threads, {queued:.1f}s of it held back by the rate limit, "
+                 f"{sum(call['retries'] for call in calls)} retries after throttling",
+                 f"  pages past the first: {len([call for call in calls if call['page'] != '1'])}"]
+
+        endpoints = {}
+        for call in calls:
+            total = endpoints.setdefault(f"{call['method']} {call['endpoint']}",[0,0.0,0])
+            total[0] += 1
+            total[1] += call['latency']
+            total[2] += call['bytes'] or 0
+        lines.append("  slowest endpoints:")
+        for name, (count, seconds, size) in sorted(endpoints.items(),key = lambda item: -item[1][1])[:SLOWEST]:
+            lines.append(f"    {name}  {count} calls, {seconds:.1f}s total, {seconds / count:.2f}s each, {size // 1024} KB")
+
+        by_phase = {}
+        for entry in phases:
+            total = by_phase.setdefault(entry['name'],[0,0.0,0.0,0])
+            total[0] += 1
+            total[1] += entry['duration']
+            total[2] += entry['cpu']
+            total[3] += entry['calls']
+        lines.append("  phases:")
+        for name, (count, seconds, phase_cpu, phase_calls) in sorted(by_phase.items(),key = lambda item: -item[1][1]):
+            times = f" x{count}" if count > 1 else ""
+            lines.append(f"    {name}{times}  {seconds:.2f}s, {phase_cpu:.2f}s CPU, {phase_calls} calls")
+        return "\n".join(lines)
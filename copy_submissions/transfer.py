@@ -0,0 +1,648 @@
+# ______TRANSFER ENGINE______
+#
+# Display-free version of the assignment and submission transfer. main_app calls into this
+# for the Run button and cli.py uses it to run a whole manifest of transfers unattended.
+# Nothing in here imports tkinter/customtkinter, so it can run on a machine with no display.
+
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from pathlib import Path
+import threading
+import time
+from canvasapi import Canvas, exceptions as c_exceptions
+from blob_store import Blob_Store
+from canvas_graphql import GraphQL_Unavailable
+from canvas_http import GOVERNOR, SESSION, install_session
+from journal import Transfer_Journal, journal_key
+from lookup import Canvas_Lookup
+from prefetch import prefetch
+from reupload import Attachment_Uploader, Upload_Error
+from roster import stream_matched_students
+# paths and link parsing live in settings.py, they are imported here too so transfer stays the one import
+# the CLI and other tools need
+from settings import (APP_DIR, BLOB_DIR, CACHE_PATH, CANVAS_URL, DEFAULT_TOKEN, JOURNAL_DIR, get_assignment_codes,
+                      get_course_code, get_course_codes, student_number)
+import tracing
+
+__all__ = ["APP_DIR", "BLOB_DIR", "CACHE_PATH", "CANVAS_URL", "DEFAULT_TOKEN", "DEFAULT_WORKERS", "JOB_ERRORS", "JOURNAL_DIR",
+           "MODES", "Transfer_Cancelled", "Transfer_Engine", "Transfer_Error", "Transfer_Job", "Transfer_Plan",
+           "Transfer_Result", "check_token", "format_bytes", "format_duration", "get_assignment_codes", "get_course_code",
+           "get_course_codes", "load_token", "student_number"]
+
+DEFAULT_WORKERS = 8  # how many students' submissions are sent to Canvas at the same time
+STUDENT_CHUNK = 50  # student ids asked for per submissions request, keeps the url a sensible length
+BULK_SHARE = 0.75  # share of the source roster chosen before its submissions are read by paging through them all
+# how attachments reach the destination: resubmit the source file ids, upload a new copy of each file,
+# or try the file ids first and upload a copy when Canvas won't take them
+MODES = ("file_ids","reupload","auto")
+
+class Transfer_Error(Exception):
+    # Raised for anything that stops a transfer from going ahead. The message is shown to the user as is.
+    pass
+
+class Transfer_Cancelled(Transfer_Error):
+    # The journal is kept, so running the same transfer again carries on from where it was cancelled.
+    def __init__(self):
+        super().__init__("Transfer cancelled. Running it again will pick up where it stopped.")
+
+# what fails one job of a batch without stopping the rest: the engine's own errors, Canvas errors and network
+# errors (requests' ConnectionError and Timeout are OSErrors)
+JOB_ERRORS = (Transfer_Error, c_exceptions.CanvasException, OSError)
+
+def load_token(token_path=DEFAULT_TOKEN):
+    # returns 2 and a Canvas handle for a valid token, 1 for an invalid token, 0 if there is no token file
+    # and 3 if Canvas couldn't be reached to check it
+    result, canvas, user = check_token(token_path)
+    return result, canvas
+
+def check_token(token_path=DEFAULT_TOKEN):
+    # load_token that also returns the token's user, checking the token and finding out whose it is are
+    # the same request
+    if Path(token_path).exists() and Path(token_path).is_file():
+        with open(token_path, 'r') as token_file:
+            api_key = token_file.read().strip()
+            canvas = Canvas(CANVAS_URL, api_key)
+            install_session(canvas)
+            try:
+                user = canvas.get_current_user()  # check to see if api key is valid by getting the user associated to it
+            except (c_exceptions.InvalidAccessToken, c_exceptions.Unauthorized, c_exceptions.ResourceDoesNotExist):
+                return 1, None, None
+            except (OSError, c_exceptions.CanvasException):
+                # no connection, a timeout (requests' errors are OSErrors) or Canvas failing with a 5xx
+                return 3, None, None
+            return 2, canvas, user
+    return 0, None, None
+
+class Transfer_Job:
+    # One source assignment going to one destination course.
+    # assignment_name of None keeps the source assignment's name, students of None transfers every student
+    # enrolled in both courses, otherwise it is a collection of Canvas user ids.
+    def __init__(self,source_course_id,source_assignment_id,destination_course_id,assignment_name = None,students = None):
+        self.source_course_id = source_course_id
+        self.source_assignment_id = source_assignment_id
+        self.destination_course_id = destination_course_id
+        self.assignment_name = assignment_name
+        self.students = students
+
+    def __repr__(self):
+        return f"Transfer_Job({self.source_course_id}/{self.source_assignment_id} -> {self.destination_course_id})"
+
+class Student_Result:
+    def __init__(self,user_id):
+        self.user_id = user_id
+        self.submitted = 0
+        self.skipped = 0  # attachments already submitted by an earlier, interrupted run
+        self.error = None
+
+class Transfer_Result:
+    def __init__(self,job,assignment,students,elapsed,resumed = False):
+        self.job = job
+        self.assignment = assignment
+        self.resumed = resumed
+        self.students = students  # one Student_Result per student transferred
+        self.elapsed = elapsed  # wall clock seconds for the whole transfer
+        self.submitted = sum(student.submitted for student in students)  # number of submit calls made
+        self.skipped = sum(student.skipped for student in students)
+        self.errors = [student for student in students if student.error is not None]
+        self.link = f"{CANVAS_URL}/courses/{job.destination_course_id}/assignments/{assignment.id}"
+
+    def summary(self):
+        text = f"{len(self.students)} students, {self.submitted} submissions in {self.elapsed:.1f}s"
+        if self.resumed:
+            text += f" (resumed, {self.skipped} already done)"
+        if self.errors:
+            text += f", {len(self.errors)} failed"
+        return text
+
+class Prepared_Transfer:
+    # a job that has its destination assignment and source submissions ready, waiting to be replayed
+    def __init__(self,job,new_assignment,submissions,journal,resumed,start):
+        self.job = job
+        self.new_assignment = new_assignment
+        self.submissions = submissions
+        self.journal = journal
+        self.resumed = resumed
+        self.start = start
+
+class Assignment_Name_Index:
+    # Names of the assignments in one destination course, read once and reused for every assignment
+    # copied into that course during a run. Names handed out are added straight away so two copies made
+    # in the same run can't both get the same name.
+    def __init__(self,names):
+        self.names = set(names)
+        self.lock = threading.Lock()
+
+    def next_free(self,name,reserve = True):
+        # name, or name (1), name (2) ... whichever is the first not already in the course
+        with self.lock:
+            candidate = name
+            counter = 0
+            while candidate in self.names:
+                counter += 1
+                candidate = name + f" ({counter})"
+            if reserve:
+                self.names.add(candidate)
+            return candidate
+
+class Transfer_Plan:
+    # What a job would do, worked out without writing anything to Canvas (see Transfer_Engine.plan)
+    def __init__(self,job,assignment_name,students,submissions,attachments,attachment_bytes,write_calls,estimate,resuming):
+        self.job = job
+        self.assignment_name = assignment_name  # name the new assignment would get, None when resuming
+        self.students = students  # students enrolled in both courses that would be transferred
+        self.submissions = submissions  # of those, how many have a submission with attachments
+        self.attachments = attachments
+        self.attachment_bytes = attachment_bytes
+        self.write_calls = write_calls  # create_assignment + the calls for each attachment still to send
+        self.estimate = estimate  # seconds, at the rate Canvas has been answering this session
+        self.resuming = resuming
+
+    def summary(self):
+        name = "resumes an interrupted transfer" if self.resuming else f'creates "{self.assignment_name}"'
+        return (f"{self.job}: {name}\n"
+                f"  {self.students} students, {self.submissions} with files, {self.attachments} attachments "
+                f"({format_bytes(self.attachment_bytes)})\n"
+                f"  {self.write_calls} write calls, about {format_duration(self.estimate)}")
+
+def format_bytes(size):
+    for unit in ("B","KB","MB","GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    return f"{int(seconds // 60)}m {int(seconds % 60):02d}s"
+
+class Transfer_Engine:
+    def __init__(self,canvas,warn = print,workers = DEFAULT_WORKERS,journal_dir = JOURNAL_DIR,lookup = None,mode = "file_ids",
+                 blob_dir = BLOB_DIR,client = None,graphql = None):
+        if mode not in MODES:
+            raise Transfer_Error(f"Unknown transfer mode {mode}")
+        self.canvas = canvas
+        self.mode = mode
+        self.uploader = None
+        if mode != "file_ids":
+            # blob_dir of None downloads every file each time it is needed
+            self.uploader = Attachment_Uploader(canvas,Blob_Store(blob_dir) if blob_dir is not None else None)
+        self.lookup = lookup if lookup is not None else Canvas_Lookup(canvas)
+        self.client = client  # an async_canvas.Async_Canvas to fetch submissions and submit with, None uses worker threads
+        self.graphql = graphql  # a canvas_graphql.Canvas_GraphQL to read rosters and submissions in bulk, None uses REST
+        self.warn = warn  # called with non fatal problems, main_app shows these in a Warning_Window
+        self.workers = max(1,workers)
+        SESSION.fit_pool(self.workers)
+        self.journal_dir = journal_dir  # None turns off checkpointing and resuming
+        self.journals = {}  # id of a job in the current batch -> (job, its Transfer_Journal), see open_journals
+        self.name_indexes = {}  # destination course id -> Future of its Assignment_Name_Index
+        self.name_lock = threading.Lock()
+        self.submission_cache = {}  # source assignment id -> {user_id: submission} for every student fetched so far
+        self.submission_locks = {}  # source assignment id -> lock held while its submissions are fetched
+
+    def run(self,job,progress = None,cancel = None):
+        # progress(done, total, submitted) is called from this thread as each student finishes,
+        # cancel is a threading.Event that stops the transfer before the next student starts
+        return self.replay(self.prepare(job,cancel),progress,cancel)
+
+    def open_journals(self,jobs):
+        # the journal each job of a batch checkpoints to, worked out in the batch's order before any of it
+        # runs. A job that repeats an earlier one in the batch gets a journal of its own, so it doesn't
+        # resume into the assignment the earlier one just made, and running the batch again pairs each
+        # job with the same journal as last time
+        journals = {}
+        repeats = {}
+        for job in jobs:
+            if id(job) in journals or self.journal_dir is None:
+                continue
+            key = journal_key(job)
+            journals[id(job)] = (job,Transfer_Journal.for_job(self.journal_dir,job,repeats.get(key,0)))
+            repeats[key] = repeats.get(key,0) + 1
+        self.journals = journals
+
+    def get_journal(self,job):
+        # None when checkpointing is off
+        if self.journal_dir is None:
+            return None
+        known = self.journals.get(id(job))
+        if known is not None and known[0] is job:
+            return known[1]
+        return Transfer_Journal.for_job(self.journal_dir,job)  # a job prepared on its own
+
+    def run_many(self,jobs,progress = None,cancel = None,on_job = None,stop_on_error = False):
+        # Runs a batch of jobs, e.g. several assignments from one course and/or one assignment fanned out to
+        # several destination courses. Each destination course gets its own pipeline (see run_pipeline) and
+        # the pipelines run at the same time. Courses, rosters, source submissions and destination
+        # assignment names are fetched once and shared by every job.
+        # on_job(index, job) is called as each job's replay starts, progress gets the totals across all
+        # destinations. Returns (results, [(job, error)]).
+        self.open_journals(jobs)
+        groups = {}
+        for i, job in enumerate(jobs):
+            groups.setdefault(job.destination_course_id,[]).append((i,job))
+        if len(groups) <= 1:
+            return self.run_pipeline(jobs,progress,cancel,on_job,stop_on_error)
+
+        SESSION.fit_pool(self.workers * len(groups))  # every destination replays with its own workers
+        counts = {}
+        counts_lock = threading.Lock()
+        def group_progress(destination_course_id):
+            def report(done,total,submitted):
+                with counts_lock:
+                    counts[destination_course_id] = (done,total,submitted)
+                    totals = [sum(count[n] for count in counts.values()) for n in range(3)]
+                if progress is not None:
+                    progress(*totals)
+            return report
+        def run_group(destination_course_id,group):
+            with tracing.phase(f"destination {destination_course_id}"):
+                return self.run_pipeline([job for i, job in group],group_progress(destination_course_id),cancel,
+                                         lambda n, job: on_job(group[n][0],job) if on_job is not None else None,stop_on_error)
+
+        results = []
+        failures = []
+        with ThreadPoolExecutor(max_workers = len(groups)) as pool:
+            futures = [pool.submit(tracing.inherit(run_group),destination_course_id,group) for destination_course_id, group in groups.items()]
+            for future in futures:
+                group_results, group_failures = future.result()
+                results += group_results
+                failures += group_failures
+        return results, failures
+
+    def run_pipeline(self,jobs,progress = None,cancel = None,on_job = None,stop_on_error = False):
+        # Runs the jobs one after another as a pipeline: while one assignment's submissions are being
+        # replayed, the next job is already being looked up and its assignment created on another thread.
+        results = []
+        failures = []
+        prepare = tracing.inherit(self.prepare)
+        with ThreadPoolExecutor(max_workers = 1) as preparer:
+            upcoming = preparer.submit(prepare,jobs[0],cancel) if jobs else None
+            for i, job in enumerate(jobs):
+                try:
+                    prepared = upcoming.result()
+                except JOB_ERRORS as e:
+                    prepared = None
+                    failures.append((job,e))
+                cancelled = cancel is not None and cancel.is_set()
+                stopping = cancelled or (stop_on_error and failures)
+                if i + 1 < len(jobs) and not stopping:
+                    upcoming = preparer.submit(prepare,jobs[i + 1],cancel)
+                if prepared is not None and not cancelled:
+                    if on_job is not None:
+                        on_job(i,job)
+                    try:
+                        results.append(self.replay(prepared,progress,cancel))
+                    except JOB_ERRORS as e:
+                        if isinstance(e,Transfer_Cancelled):
+                            raise
+                        failures.append((job,e))
+                if cancel is not None and cancel.is_set():
+                    upcoming.cancel()  # if the next job's prepare hasn't started, otherwise it stops itself
+                    raise Transfer_Cancelled()
+                if stop_on_error and failures:
+                    break
+        return results, failures
+
+    def prepare(self,job,cancel = None):
+        # everything up to the first submit: lookups, checks, fetching the submissions and creating (or
+        # finding, when resuming) the destination assignment
+        with tracing.phase("prepare"):
+            return self.prepare_job(job,cancel)
+
+    def prepare_job(self,job,cancel = None):
+        start = time.perf_counter()
+        source_assignment, destination_course, students_chosen, submissions = self.resolve(job)
+
+        journal = self.get_journal(job)
+        new_assignment = self.resume_assignment(journal,destination_course)
+        resumed = new_assignment is not None
+        if not resumed:
+            assignment_name = source_assignment.name if job.assignment_name is None else job.assignment_name
+            if cancel is not None and cancel.is_set():
+                raise Transfer_Cancelled()  # the reads are harmless, but nothing gets created after a cancel
+            assignment_name = self.get_assignment_name(assignment_name,destination_course)
+            new_assignment = self.copy_assignment(source_assignment,destination_course,assignment_name)
+            if journal is not None:
+                journal.set_assignment(new_assignment.id)
+        return Prepared_Transfer(job,new_assignment,submissions,journal,resumed,start)
+
+    def plan(self,job):
+        # dry run: does every read prepare and replay would do and counts what they would write
+        with tracing.phase("plan"):
+            return self.plan_job(job)
+
+    def plan_job(self,job):
+        source_assignment, destination_course, students_chosen, submissions = self.resolve(job)
+        journal = self.get_journal(job)
+        resuming = journal is not None and journal.resumable
+        assignment_name = None
+        if not resuming:
+            assignment_name = source_assignment.name if job.assignment_name is None else job.assignment_name
+            assignment_name = self.get_name_index(destination_course).next_free(assignment_name,reserve = False)
+
+        attachments = [a for s in submissions for a in s.attachments
+                       if not (resuming and journal.is_done(s.user_id,a.id))]
+        # a re-upload is three calls: ask for the upload, confirm it, submit the new file
+        write_calls = len(attachments) * (3 if self.mode == "reupload" else 1) + (0 if resuming else 1)
+        return Transfer_Plan(job,assignment_name,len(students_chosen),
+                             len([s for s in submissions if s.attachments]),len(attachments),
+                             sum(getattr(a,'size',0) or 0 for a in attachments),write_calls,
+                             GOVERNOR.estimate_seconds(write_calls,self.workers),resuming)
+
+    def plan_many(self,jobs):
+        # plans for every job, with the jobs for each destination course planned at the same time. Like
+        # run_many a job that can't be planned doesn't stop the others, returns (plans, [(job, error)])
+        self.open_journals(jobs)
+        plans = []
+        failures = []
+        with ThreadPoolExecutor(max_workers = max(1,len({job.destination_course_id for job in jobs}))) as pool:
+            futures = [pool.submit(tracing.inherit(self.plan),job) for job in jobs]
+            for job, future in zip(jobs,futures):
+                try:
+                    plans.append(future.result())
+                except JOB_ERRORS as e:
+                    failures.append((job,e))
+        return plans, failures
+
+    def plan_summary(self,plans):
+        # one line totalling a batch of plans, timed as one run rather than adding up each job's estimate
+        write_calls = sum(plan.write_calls for plan in plans)
+        return (f"{len(plans)} transfers, {sum(plan.attachments for plan in plans)} attachments "
+                f"({format_bytes(sum(plan.attachment_bytes for plan in plans))}), {write_calls} write calls, "
+                f"about {format_duration(GOVERNOR.estimate_seconds(write_calls,self.workers))}")
+
+    def resolve(self,job):
+        # the reads shared by prepare and plan
+        source_course = self.lookup.get_course(job.source_course_id)
+        source_assignment = self.lookup.get_assignment(source_course,job.source_assignment_id,fresh = True)  # its settings get copied
+        destination_course = self.lookup.get_course(job.destination_course_id)
+
+        self.run_checks(source_course,source_assignment,destination_course)
+
+        if job.assignment_name is not None and len(job.assignment_name) == 0:
+            raise Transfer_Error("Assignment name cannot be blank.")
+
+        if self.graphql is not None:
+            with tracing.phase("bulk read"):
+                self.bulk_read(source_course,source_assignment,destination_course,job.students)
+
+        with tracing.phase("match rosters"):
+            students_chosen = {student.id for student in self.get_matched_students(source_course,[destination_course])}
+        if job.students is not None:
+            students_chosen &= set(job.students)  # a student picked for a fan-out may not be in every destination
+            if not students_chosen:
+                raise Transfer_Error("None of the chosen students are enrolled in the destination course.")
+
+        submissions = self.get_submissions(source_course,source_assignment,students_chosen)
+        return source_assignment, destination_course, students_chosen, submissions
+
+    def replay(self,prepared,progress = None,cancel = None):
+        with tracing.phase("replay"):
+            students = self.replay_submissions(prepared.new_assignment,prepared.submissions,prepared.journal,progress,cancel)
+        if cancel is not None and cancel.is_set():
+            raise Transfer_Cancelled()
+        result = Transfer_Result(prepared.job,prepared.new_assignment,students,time.perf_counter() - prepared.start,prepared.resumed)
+        if prepared.journal is not None and not result.errors:
+            prepared.journal.finish()
+        return result
+
+    def bulk_read(self,source_course,source_assignment,destination_course,students = None):
+        # reads the rosters and submissions resolve needs through GraphQL, all in the same queries, and
+        # leaves them where get_matched_students and get_submissions look first. Anything GraphQL can't
+        # answer is left for them to read over REST. GraphQL pages come one after another where REST pages
+        # and chunks of ids are fetched several at once, so submissions are only read here when most of the
+        # roster is being transferred, and a small selection whose rosters are known already skips the bulk
+        # read altogether. Held throughout, so jobs sharing the source assignment don't all read its
+        # submissions.
+        with self.submission_lock(source_assignment.id):
+            courses = [course for course in (source_course,destination_course) if not self.lookup.has_students(course)]
+            cache = self.submission_cache.setdefault(source_assignment.id,{})
+            if students is None:
+                most = True
+            elif self.lookup.has_students(source_course):
+                most = len(students) >= BULK_SHARE * len(list(self.lookup.iter_students(source_course)))
+            else:
+                most = False  # the roster size isn't known yet, asking for the chosen students by id is never far off
+            read_submissions = not cache and most
+            if not courses and not read_submissions:
+                return
+            try:
+                rosters, submissions = self.graphql.read_transfer([course.id for course in courses],source_course.id,
+                                                                  source_assignment.id if read_submissions else None)
+            except GraphQL_Unavailable:
+                return
+            for course in courses:
+                self.lookup.remember_students(course,rosters[course.id])
+            if read_submissions:
+                for student in self.lookup.iter_students(source_course):
+                    cache[student.id] = None  # no submission, don't ask again
+                for s in submissions:
+                    if s.user_id in cache:
+                        cache[s.user_id] = s
+
+    def get_submissions(self,source_course,source_assignment,students):
+        # only the chosen students' submissions, asked for by user id in chunks rather than paging through
+        # the whole class. Canvas includes each submission's attachments by default. Submissions are kept
+        # for the rest of the run, so sending the same assignment to more courses only fetches students
+        # that haven't been fetched yet.
+        with self.submission_lock(source_assignment.id), tracing.phase("fetch submissions"):
+            cache = self.submission_cache.setdefault(source_assignment.id,{})
+            ids = sorted(set(students) - cache.keys())
+            pages = self.fetch_submissions(source_course,source_assignment,ids)
+            for user_id in ids:
+                cache[user_id] = None  # no submission, don't ask again
+            for page in pages:
+                for s in page:
+                    if s.user_id in cache:
+                        cache[s.user_id] = s
+            return [cache[user_id] for user_id in sorted(students) if cache.get(user_id) is not None]
+
+    def fetch_submissions(self,source_course,source_assignment,ids):
+        # pages of submissions that include every student in ids
+        chunks = [ids[i:i + STUDENT_CHUNK] for i in range(0,len(ids),STUDENT_CHUNK)]
+        if self.client is not None:
+            return self.client.loop.run(self.get_submissions_async(source_course.id,source_assignment.id,chunks))
+        def fetch(chunk):
+            return list(prefetch(source_course.get_multiple_submissions(assignment_ids = [source_assignment.id],
+                                                                        student_ids = chunk)))
+        with ThreadPoolExecutor(max_workers = self.workers) as pool:
+            return list(pool.map(tracing.inherit(fetch),chunks))
+
+    async def get_submissions_async(self,course_id,assignment_id,chunks):
+        return await asyncio.gather(*[self.client.get_submissions(course_id,assignment_id,chunk) for chunk in chunks])
+
+    def submission_lock(self,assignment_id):
+        with self.name_lock:
+            return self.submission_locks.setdefault(assignment_id,threading.Lock())
+
+    def resume_assignment(self,journal,destination_course):
+        # the assignment made by an earlier interrupted run of the same transfer, if it is still there
+        if journal is None or not journal.resumable:
+            return None
+        try:
+            return destination_course.get_assignment(journal.assignment_id)
+        except c_exceptions.ResourceDoesNotExist:
+            journal.finish()  # it was deleted in Canvas, start over
+            return None
+
+    def replay_submissions(self,new_assignment,submissions,journal = None,progress = None,cancel = None):
+        # each student's attachments are submitted in order by one worker, different students run in parallel
+        if self.client is not None:
+            # cancel is checked between attachments, so what was already submitted still reaches the journal
+            return self.client.loop.run(self.replay_async(new_assignment,submissions,journal,progress,cancel))
+        results = [None] * len(submissions)
+        done = submitted = 0
+        with ThreadPoolExecutor(max_workers = self.workers) as pool:
+            submit_student = tracing.inherit(self.submit_student)
+            futures = {pool.submit(submit_student,new_assignment,s,journal,cancel): i for i, s in enumerate(submissions)}
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                done += 1
+                submitted += result.submitted
+                if progress is not None:
+                    progress(done,len(submissions),submitted)
+        return results
+
+    async def replay_async(self,new_assignment,submissions,journal = None,progress = None,cancel = None):
+        # same as the threads above with every student a coroutine, how many requests are in flight is up
+        # to the client rather than the number of workers
+        results = [None] * len(submissions)
+        done = submitted = 0
+        async def submit_student(index,source_submission):
+            results[index] = await self.submit_student_async(new_assignment,source_submission,journal,cancel)
+            return results[index]
+        for next_done in asyncio.as_completed([submit_student(i,s) for i, s in enumerate(submissions)]):
+            result = await next_done
+            done += 1
+            submitted += result.submitted
+            if progress is not None:
+                progress(done,len(submissions),submitted)
+        return results
+
+    def submit_student(self,new_assignment,source_submission,journal = None,cancel = None):
+        result = Student_Result(source_submission.user_id)
+        if cancel is not None and cancel.is_set():
+            return result
+        try:
+            for a in source_submission.attachments:
+                if journal is not None and journal.is_done(source_submission.user_id,a.id):
+                    result.skipped += 1
+                    continue
+                self.submit_attachment(new_assignment,source_submission.user_id,a)
+                result.submitted += 1
+                if journal is not None:
+                    journal.mark_done(source_submission.user_id,a.id)
+        except (c_exceptions.CanvasException, Upload_Error, OSError) as e:  # OSError covers requests' connection errors
+            result.error = e
+        return result
+
+    def submit_attachment(self,new_assignment,user_id,attachment):
+        if self.mode == "file_ids" or self.mode == "auto":
+            try:
+                submitted = new_assignment.submit({"user_id": user_id,"submission_type": 'online_upload','file_ids': [attachment.id]})
+                if self.mode == "file_ids" or getattr(submitted,'attachments',None) != []:
+                    return
+                # auto: Canvas made a submission without the file, send a copy of it instead
+            except (c_exceptions.BadRequest, c_exceptions.Forbidden, c_exceptions.ResourceDoesNotExist) as e:
+                if self.mode == "file_ids" or "Rate Limit Exceeded" in str(e):
+                    raise
+        file_id = self.uploader.reupload(new_assignment,user_id,attachment)
+        new_assignment.submit({"user_id": user_id,"submission_type": 'online_upload','file_ids': [file_id]})
+
+    async def submit_student_async(self,new_assignment,source_submission,journal = None,cancel = None):
+        result = Student_Result(source_submission.user_id)
+        try:
+            for a in source_submission.attachments:
+                if cancel is not None and cancel.is_set():
+                    break
+                if journal is not None and journal.is_done(source_submission.user_id,a.id):
+                    result.skipped += 1
+                    continue
+                await self.submit_attachment_async(new_assignment,source_submission.user_id,a)
+                result.submitted += 1
+                if journal is not None:
+                    # the journal fsyncs each entry, which mustn't hold up the event loop
+                    await asyncio.to_thread(journal.mark_done,source_submission.user_id,a.id)
+        except (c_exceptions.CanvasException, Upload_Error, OSError) as e:  # OSError covers Async_Request_Error
+            result.error = e
+        return result
+
+    async def submit_attachment_async(self,new_assignment,user_id,attachment):
+        course_id = new_assignment.course_id
+        if self.mode == "file_ids" or self.mode == "auto":
+            try:
+                submitted = await self.client.submit(course_id,new_assignment.id,
+                                                     {"user_id": user_id,"submission_type": 'online_upload','file_ids': [attachment.id]})
+                if self.mode == "file_ids" or getattr(submitted,'attachments',None) != []:
+                    return
+            except (c_exceptions.BadRequest, c_exceptions.Forbidden, c_exceptions.ResourceDoesNotExist) as e:
+                if self.mode == "file_ids" or "Rate Limit Exceeded" in str(e):
+                    raise
+        # uploads stream files through the sync session, on a thread so the loop keeps going
+        file_id = await asyncio.to_thread(self.uploader.reupload,new_assignment,user_id,attachment)
+        await self.client.submit(course_id,new_assignment.id,{"user_id": user_id,"submission_type": 'online_upload','file_ids': [file_id]})
+
+    def copy_assignment(self,assignment_to_copy,destination_course,assignment_name):
+        assignment_params = {
+            "name": assignment_name,
+            "description": assignment_to_copy.description,
+            "points_possible": assignment_to_copy.points_possible,
+            "submission_types": ['online_upload'],
+            "due_at": assignment_to_copy.due_at,
+            "unlock_at": assignment_to_copy.unlock_at,
+            "lock_at": assignment_to_copy.lock_at,
+            "published": True,
+            "allowed_extensions":assignment_to_copy.allowed_extensions
+        }
+
+        with tracing.phase("create assignment"):
+            new_assignment = destination_course.create_assignment(assignment_params)
+        if not new_assignment:
+            raise Transfer_Error("Assignment not made")
+        return new_assignment
+
+    def run_checks(self,source,assignment,destination):
+        if source.id == destination.id:
+            raise Transfer_Error("Source and destination courses are the same course")
+        elif assignment.submission_types != ['online_upload']:
+            self.warn("Assignment either does not accept or does not exclusively accept online uploads. This is required.")
+
+    def get_assignment_name(self,name,destination_course):
+        return self.get_name_index(destination_course).next_free(name)
+
+    def get_name_index(self,destination_course):
+        # the course's names are read outside name_lock, jobs for other courses don't wait on them and jobs
+        # for the same course wait for the one read, like Canvas_Lookup.memo
+        with self.name_lock:
+            waiting = self.name_indexes.get(destination_course.id)
+            if waiting is None:
+                future = self.name_indexes[destination_course.id] = Future()
+        if waiting is not None:
+            return waiting.result()
+        try:
+            names = [assignment.name for assignment in prefetch(destination_course.get_assignments())]
+        except BaseException as e:
+            with self.name_lock:
+                del self.name_indexes[destination_course.id]  # the next job asks again
+            future.set_exception(e)
+            raise
+        future.set_result(Assignment_Name_Index(names))
+        return future.result()
+
+    def get_matched_students(self,source_course,destination_courses,on_match = None,cancel = None,refresh = False):
+        # students enrolled in the source course and at least one of the destination courses,
+        # in the source course's order
+        return stream_matched_students(self.lookup.iter_students(source_course,refresh),
+                                       [self.lookup.iter_students(course,refresh) for course in destination_courses],
+                                       on_match,cancel)
+
+    def resolve_students(self,source_course_id,destination_course_id,filters):
+        # turns a list of Canvas ids / student numbers into the Canvas user ids of matched students
+        source_course = self.lookup.get_course(source_course_id)
+        destination_course = self.lookup.get_course(destination_course_id)
+        wanted = {str(f).strip() for f in filters if str(f).strip()}
+        found = []
+        for student in self.get_matched_students(source_course,[destination_course]):
+            if str(student.id) in wanted or str(student_number(student)) in wanted:
+                found.append(student.id)
+        return found